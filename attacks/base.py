@@ -1,3 +1,4 @@
+import random
 from abc import ABC, abstractmethod
 from core.normal_client import TLSClient
 
@@ -16,13 +17,44 @@ class BaseAttack(ABC):
             host=host,
             port=port,
             kem_algorithm=kem_algorithm,
-            sig_algorithm=sig_algorithm
+            sig_algorithm=sig_algorithm,
+            ca_file=self.server_config.get('ca_file'),
+            record=self.config.get('record'),
+            ciphersuites=self.config.get('ciphersuites'),
+            timeouts=self.config.get('timeouts')
         )
 
+        # mTLS：Server 發出的 Client 憑證依序輪流使用；模式設定 client_cert: false 時不送出憑證
+        self.client_certs = self.server_config.get('client_certs', []) if self.config.get('client_cert', True) else []
+        self._next_cert = 0
+        self.next_client_cert()
+
+        # 每個連線的算法分布，例如 {kem: {X25519MLKEM768: 0.6, mlkem768: 0.3, x25519: 0.1}}
+        self.algorithm_mix = self.config.get('algorithm_mix', {})
+
     @abstractmethod
     def execute(self):
         pass
 
+    def next_algorithms(self):
+        """依 algorithm_mix 為下一個連線抽選 KEM / 簽章算法（未設定時沿用 Server 設定）"""
+        for key, attr in (('kem', 'kem_algorithm'), ('sig', 'sig_algorithm')):
+            weights = self.algorithm_mix.get(key)
+            if weights:
+                choice = random.choices(list(weights), weights=list(weights.values()))[0]
+                setattr(self.client, attr, choice)
+        return self.client.kem_algorithm, self.client.sig_algorithm
+
+    def next_client_cert(self):
+        """輪流為下一個連線選用 Client 憑證（未啟用 mTLS 時不動作）"""
+        if not self.client_certs:
+            return None
+        key_file, cert_file = self.client_certs[self._next_cert % len(self.client_certs)]
+        self._next_cert += 1
+        self.client.key_file = key_file
+        self.client.cert_file = cert_file
+        return cert_file
+
     def get_pattern_info(self):
         return {
             'type': self.config.get('type', 'unknown'),
@@ -1,6 +1,27 @@
+import os
 import random
 import time
 from attacks.base import BaseAttack
+from utils.profiler import profiler
+
+PAYLOAD_DIR = 'data/payloads'
+
+
+def _ensure_payload(size):
+    """
+    建立 Server -WWW 模式下載用的 payload 檔案（相對於工作目錄，與 Server 相同）
+
+    Returns:
+        str: 下載請求的 URL 路徑
+    """
+    path = os.path.join(PAYLOAD_DIR, f'payload_{size}.bin')
+    if not os.path.exists(path):
+        os.makedirs(PAYLOAD_DIR, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='ascii') as f:
+            f.write('X' * size)
+        os.replace(tmp_path, path)
+    return '/' + path.replace(os.sep, '/')
 
 
 class SimpleTraffic(BaseAttack):
@@ -17,26 +38,94 @@ class SimpleTraffic(BaseAttack):
         #  是否為突發模式（burst 模式會有 70% 機率短間隔，30% 機率正常間隔）
         burst = self.config.get('burst', False)
 
+        # 下載模式：改為向 Server 請求 payload（true 時大小取自 size 範圍並取整到 KiB，整數為固定大小）
+        download = self.config.get('download', False)
+
         pattern_info = self.get_pattern_info()
         print(f"\n開始執行: {pattern_info['description']}")
         print(f"總連線數: {connections}")
         print(f"封包大小範圍: {size_min} - {size_max} bytes")
         print(f"時間間隔範圍: {interval_min} - {interval_max} 秒")
-        print(f"Burst 模式: {'是' if burst else '否'}\n")
+        print(f"Burst 模式: {'是' if burst else '否'}")
+        if download:
+            print(f"下載模式: {'固定 ' + str(download) + ' bytes' if download is not True else '是'}")
+        print()
 
         success_count = 0
         fail_count = 0
+        latencies = []
+        # TCP 連線建立到握手完成（不含 s_client 啟動），供比較 KEM / 簽章算法
+        handshake_latencies = []
+        algorithms = {}
+        # 每個連線的 Client 埠與協商出的算法，以 (client_port, Server 埠) 標記混合算法 PCAP 中的各 flow
+        negotiations = []
+        auth = {}
+        handshake_bytes = {'read': 0, 'written': 0}
+        client_cert_bytes = 0
+        bytes_received = 0
+        transfer_time = 0.0
+        client_cpu_seconds = 0.0
+        client_cpu_samples = 0
+        ciphers = {}
+        errors = {}
+        alerts = {}
 
         for i in range(connections):
-            size = random.randint(size_min, size_max)
-            message = "X" * min(size, 10000) # 限制單次訊息最大 10KB
+            if download:
+                size = download if download is not True else -(-random.randint(size_min, size_max) // 1024) * 1024
+                message = f"GET {_ensure_payload(size)} HTTP/1.0"
+            else:
+                size = random.randint(size_min, size_max)
+                message = "X" * min(size, 10000) # 限制單次訊息最大 10KB
+
+            self.next_algorithms()
+            self.next_client_cert()
 
             try:
-                self.client.connect(message=message, debug=False)
-                success_count += 1
-                print(f"[{i+1}/{connections}] [OK] 成功 - {size} bytes")
+                started_at = time.time()
+                result = self.client.connect(message=message, debug=False, wait_response=bool(download),
+                                             record_port=True)
+                negotiations.append({
+                    'start': started_at,
+                    'client_port': result['client_port'],
+                    'group': result['negotiated_group'],
+                    'signature': result['peer_signature'],
+                    'success': result['success'],
+                })
+                if result['handshake_bytes']:
+                    handshake_bytes['read'] += result['handshake_bytes']['read']
+                    handshake_bytes['written'] += result['handshake_bytes']['written']
+                if download and result['success'] and result['response_status'] != 200:
+                    result['success'] = False
+                    result['error'] = f"http_{result['response_status']}"
+                if result['success']:
+                    success_count += 1
+                    latencies.append(result['duration'])
+                    if result['handshake_duration'] is not None:
+                        handshake_latencies.append(result['handshake_duration'])
+                    auth[result['auth']] = auth.get(result['auth'], 0) + 1
+                    client_cert_bytes += result['client_cert_bytes']
+                    ciphers[result['cipher']] = ciphers.get(result['cipher'], 0) + 1
+                    if download:
+                        # 只計握手完成到連線關閉的時間與 CPU，排除 s_client 啟動與握手
+                        bytes_received += size
+                        transfer_time += result['transfer_duration'] or 0.0
+                        if result['transfer_cpu_seconds'] is not None:
+                            client_cpu_seconds += result['transfer_cpu_seconds']
+                            client_cpu_samples += 1
+                    negotiated = f"{result['negotiated_group']}/{result['peer_signature']}"
+                    algorithms[negotiated] = algorithms.get(negotiated, 0) + 1
+                    print(f"[{i+1}/{connections}] [OK] 成功 - {size} bytes ({negotiated})")
+                else:
+                    fail_count += 1
+                    errors[result['error']] = errors.get(result['error'], 0) + 1
+                    if result.get('alert'):
+                        alert = f"{result['alert']['code']} {result['alert']['description']}"
+                        alerts[alert] = alerts.get(alert, 0) + 1
+                    print(f"[{i+1}/{connections}] [FAIL] {self.client.describe_error(result)}")
             except Exception as e:
                 fail_count += 1
+                errors['exception'] = errors.get('exception', 0) + 1
                 print(f"[{i+1}/{connections}] [FAIL] 失敗: {e}")
 
             if i < connections - 1:
@@ -45,7 +134,33 @@ class SimpleTraffic(BaseAttack):
                 else:
                     interval = random.uniform(interval_min, interval_max)
 
-                time.sleep(interval)
+                with profiler.span('sleep'):
+                    time.sleep(interval)
 
         print(f"\n完成! 成功: {success_count}, 失敗: {fail_count}")
-        return {'success': success_count, 'failed': fail_count}
+        if errors:
+            print(f"錯誤分類: {errors}")
+        if algorithms:
+            print(f"協商算法分布: {algorithms}")
+
+        result = {
+            'success': success_count,
+            'failed': fail_count,
+            'latencies': latencies,
+            'handshake_latencies': handshake_latencies,
+            'algorithms': algorithms,
+            'negotiations': negotiations,
+            'auth': auth,
+            'ciphers': ciphers,
+            'errors': errors,
+            'alerts': alerts,
+            'handshake_bytes': handshake_bytes,
+            'client_cert_bytes': client_cert_bytes,
+        }
+        if download:
+            result['bytes_received'] = bytes_received
+            result['transfer_time'] = transfer_time
+            result['client_cpu_seconds'] = client_cpu_seconds if client_cpu_samples == success_count else None
+            if transfer_time > 0:
+                print(f"下載: {bytes_received} bytes，{bytes_received * 8 / transfer_time / 1e6:.2f} Mbit/s")
+        return result
@@ -0,0 +1,3 @@
+from .handshake_flood import HandshakeFlood
+
+__all__ = ['HandshakeFlood']
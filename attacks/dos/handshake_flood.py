@@ -0,0 +1,289 @@
+import asyncio
+import ipaddress
+import os
+import socket
+import subprocess
+import threading
+import time
+from attacks.base import BaseAttack
+from core.normal_client import TLSClient
+from utils import metrics
+from utils.cpu_usage import process_cpu_seconds
+from utils.listen_queue import listen_queue
+from utils.stats import summarize_flood
+
+TLS_HANDSHAKE = 0x16
+TLS_ALERT = 0x15
+CLIENT_HELLO = 0x01
+
+# record header (5) + handshake header (4) + legacy_version (2)
+RANDOM_OFFSET = 11
+SESSION_ID_OFFSET = RANDOM_OFFSET + 32
+
+
+class ClientHelloTemplate:
+    """
+    以 openssl s_client 產生一次 ClientHello（含完整 PQC key_share）並快取
+
+    重放時只替換 random 與 legacy_session_id，key_share 保持不變；
+    Server 端每次仍需完整執行 KEM 封裝，因此負載與真實握手相同。
+    """
+
+    _cache = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, kem_algorithm, sig_algorithm):
+        key = (str(kem_algorithm), str(sig_algorithm))
+        with cls._lock:
+            if key not in cls._cache:
+                cls._cache[key] = cls._capture(kem_algorithm, sig_algorithm)
+            return cls._cache[key]
+
+    @staticmethod
+    def _capture(kem_algorithm, sig_algorithm, timeout=10):
+        """在本機暫時監聽，讓 s_client 連入並擷取第一個 TLS record"""
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        listener.settimeout(timeout)
+        port = listener.getsockname()[1]
+
+        client = TLSClient(host='127.0.0.1', port=port,
+                           kem_algorithm=kem_algorithm, sig_algorithm=sig_algorithm)
+        process = subprocess.Popen(
+            client.build_command(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+        try:
+            conn, _ = listener.accept()
+            with conn:
+                conn.settimeout(timeout)
+                header = _recv_exactly(conn, 5)
+                body = _recv_exactly(conn, int.from_bytes(header[3:5], 'big'))
+        finally:
+            listener.close()
+            process.kill()
+            process.wait()
+
+        if header[0] != TLS_HANDSHAKE or body[0] != CLIENT_HELLO:
+            raise RuntimeError("擷取到的第一個 record 不是 ClientHello")
+
+        template = header + body
+        print(f"[OK] ClientHello 範本已建立: {kem_algorithm} ({len(template)} bytes)")
+        return template
+
+    @staticmethod
+    def randomize(template):
+        """替換 random 與 session id，產生新的 ClientHello"""
+        hello = bytearray(template)
+        hello[RANDOM_OFFSET:SESSION_ID_OFFSET] = os.urandom(32)
+        session_id_len = hello[SESSION_ID_OFFSET]
+        start = SESSION_ID_OFFSET + 1
+        hello[start:start + session_id_len] = os.urandom(session_id_len)
+        return bytes(hello)
+
+
+def _recv_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise RuntimeError("連線在 ClientHello 完整送出前關閉")
+        data += chunk
+    return data
+
+
+class HandshakeFlood(BaseAttack):
+    """
+    握手洪泛容量測試（G. DoS 與資源耗盡）
+
+    以預先建立的 ClientHello 範本，透過 asyncio 非阻塞 socket
+    以固定速率重放，量測 Server CPU 與 accept queue 在不同 PQC key_share
+    大小下的表現。只允許連到設定中的本機 Server。
+
+    結果只包含可相加的欄位與原始延遲列表；速率、CPU 使用率與 accept queue 摘要
+    由 summarize_flood 依 flood 視窗在合併（parallel）之後計算。
+    """
+
+    def execute(self):
+        host = self.server_config.get('host', 'localhost')
+        port = self.server_config.get('port', 4433)
+        self._ensure_local(host)
+
+        kem_algorithm = self.config.get('kem_algorithm', self.client.kem_algorithm)
+        rate = self.config.get('rate', 100)
+        duration = self.config.get('duration', 10)
+        total = self.config.get('connections', int(rate * duration))
+        concurrency = self.config.get('concurrency', 500)
+        connect_timeout = self.config.get('connect_timeout', 2.0)
+        response_timeout = self.config.get('response_timeout', 5.0)
+        queue_interval = self.config.get('queue_sample_interval', 0.05)
+
+        template = ClientHelloTemplate.get(kem_algorithm, self.client.sig_algorithm)
+
+        pattern_info = self.get_pattern_info()
+        print(f"\n開始執行: {pattern_info['description']}")
+        print(f"目標: {host}:{port}  KEM: {kem_algorithm}")
+        print(f"速率: {rate} 握手/秒  總數: {total}  並行上限: {concurrency}")
+        print(f"ClientHello 大小: {len(template)} bytes\n")
+
+        server_pid = self.server_config.get('server_pid')
+        queue_samples = []
+        cpu_before = process_cpu_seconds(server_pid)
+
+        start = time.time()
+        outcomes = asyncio.run(self._flood(
+            host, port, template, rate, total, concurrency, connect_timeout, response_timeout,
+            queue_samples, queue_interval
+        ))
+        end = time.time()
+
+        cpu_after = process_cpu_seconds(server_pid)
+
+        errors = {}
+        connect_latencies = []
+        response_latencies = []
+        for outcome, connect_latency, response_latency in outcomes:
+            if outcome == 'ok':
+                connect_latencies.append(connect_latency)
+                response_latencies.append(response_latency)
+            else:
+                errors[outcome] = errors.get(outcome, 0) + 1
+
+        success = len(response_latencies)
+        window = {
+            'start': start,
+            'end': end,
+            'handshakes': success,
+            'client_hello_bytes': len(template),
+            'server_cpu': [cpu_before, cpu_after] if cpu_before is not None and cpu_after is not None else None,
+            'listen_queue': queue_samples,
+        }
+        result = {
+            'success': success,
+            'failed': len(outcomes) - success,
+            'errors': errors,
+            'latencies': response_latencies,
+            'connect_latencies': connect_latencies,
+            'flood': [window],
+        }
+
+        summary = summarize_flood([window])
+        print(f"\n完成! 成功: {success}, 失敗: {result['failed']}, "
+              f"實際速率: {summary['achieved_rate']:.1f} 握手/秒")
+        if errors:
+            print(f"錯誤分類: {errors}")
+        if summary['server_cpu_utilization'] is not None:
+            print(f"Server CPU: {summary['server_cpu_utilization']:.1%}")
+        if summary['listen_queue']:
+            print(f"Accept queue: 最大 {summary['listen_queue']['max']}，平均 {summary['listen_queue']['mean']:.1f}")
+        else:
+            print("[WARN] 無法取得 accept queue（需要 Linux /proc/net/tcp）")
+
+        return result
+
+    @staticmethod
+    def _ensure_local(host):
+        """只允許解析到 loopback 位址的目標"""
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+        for address in addresses:
+            if not ipaddress.ip_address(address.split('%')[0]).is_loopback:
+                raise ValueError(f"handshake_flood 只能對本機 Server 執行，{host} 解析到 {address}")
+
+    @staticmethod
+    async def _sample_listen_queue(port, samples, interval):
+        """定期記錄 Server 監聽埠等待 accept 的連線數，平台不支援時停止"""
+        while True:
+            queued = listen_queue(port)
+            if queued is None:
+                return
+            samples.append(queued)
+            await asyncio.sleep(interval)
+
+    async def _flood(self, host, port, template, rate, total, concurrency,
+                     connect_timeout, response_timeout, queue_samples, queue_interval):
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(concurrency)
+        tasks = []
+        skipped = []
+        sampler = asyncio.create_task(self._sample_listen_queue(port, queue_samples, queue_interval))
+
+        start = loop.time()
+        for i in range(total):
+            delay = start + i / rate - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            # 開放式負載：並行數已滿時不等待，直接記為 client 端跳過
+            if slots.locked():
+                skipped.append(('client_saturated', None, None))
+                metrics.FLOOD_HANDSHAKES.labels(outcome='client_saturated').inc()
+                continue
+
+            await slots.acquire()
+            tasks.append(asyncio.create_task(self._handshake(
+                host, port, ClientHelloTemplate.randomize(template),
+                connect_timeout, response_timeout, slots
+            )))
+
+        try:
+            return list(await asyncio.gather(*tasks)) + skipped
+        finally:
+            sampler.cancel()
+
+    async def _handshake(self, host, port, hello, connect_timeout, response_timeout, slots):
+        loop = asyncio.get_running_loop()
+        writer = None
+        outcome, connect_latency, response_latency = 'ok', None, None
+
+        try:
+            t0 = loop.time()
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(host, port), connect_timeout
+                )
+            except asyncio.TimeoutError:
+                outcome = 'connect_timeout'
+                return outcome, None, None
+            except ConnectionRefusedError:
+                outcome = 'refused'
+                return outcome, None, None
+
+            t1 = loop.time()
+            connect_latency = t1 - t0
+            writer.write(hello)
+            await writer.drain()
+
+            try:
+                header = await asyncio.wait_for(reader.readexactly(5), response_timeout)
+            except asyncio.TimeoutError:
+                outcome = 'response_timeout'
+                return outcome, connect_latency, None
+            except asyncio.IncompleteReadError:
+                outcome = 'closed'
+                return outcome, connect_latency, None
+
+            response_latency = loop.time() - t1
+            if header[0] == TLS_ALERT:
+                outcome = 'alert'
+            elif header[0] != TLS_HANDSHAKE:
+                outcome = 'unexpected_record'
+            else:
+                metrics.FLOOD_RESPONSE_LATENCY.observe(response_latency)
+            return outcome, connect_latency, response_latency
+
+        except (ConnectionResetError, BrokenPipeError):
+            outcome = 'reset'
+            return outcome, connect_latency, None
+        except OSError:
+            outcome = 'os_error'
+            return outcome, connect_latency, None
+        finally:
+            metrics.FLOOD_HANDSHAKES.labels(outcome=outcome).inc()
+            if writer is not None:
+                writer.transport.abort()
+            slots.release()
@@ -0,0 +1,308 @@
+import queue
+import random
+import socket
+import threading
+import time
+
+
+class ImpairmentProxy:
+    """
+    使用者空間的 TCP 網路劣化代理（不需 root 或 tc/netem）
+
+    位於 Client 與 TLSServer 之間，對每個方向的資料套用：
+    RTT / 抖動、封包遺失（以重傳逾時懲罰模擬）、頻寬上限、
+    MSS 分段以及初始擁塞視窗（slow start），
+    讓 PQC 握手超過 initcwnd / 單一 MTU 的影響能在 loopback 上重現。
+
+    profile 參數:
+        rtt: 往返延遲（ms）
+        jitter: 單向延遲抖動（ms）
+        loss: 分段遺失機率（0-1）
+        bandwidth: 頻寬上限（kbps，0 = 不限制）
+        mss: 最大分段大小（bytes）
+        init_cwnd: 初始擁塞視窗（分段數）
+        rto: 遺失後的重傳逾時（ms，預設 max(200, 2 * rtt)）
+    """
+
+    DEFAULT_PROFILE = {
+        'rtt': 0,
+        'jitter': 0,
+        'loss': 0.0,
+        'bandwidth': 0,
+        'mss': 1460,
+        'init_cwnd': 10,
+        'rto': None,
+    }
+
+    def __init__(self, listen_port, target_host='localhost', target_port=4433,
+                 profile=None, listen_host='127.0.0.1'):
+        self.listen_host = listen_host
+        self.listen_port = listen_port
+        self.target_host = target_host
+        self.target_port = target_port
+
+        self.profile = dict(self.DEFAULT_PROFILE)
+        self.profile.update(profile or {})
+
+        self.listener = None
+        self.accept_thread = None
+        self.is_running = False
+        self.links = set()
+
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'connections': 0,
+            'upstream_errors': 0,
+            'bytes_client_to_server': 0,
+            'bytes_server_to_client': 0,
+            'segments': 0,
+            'lost_segments': 0,
+            'max_queue_delay': 0.0,
+        }
+
+    def start(self):
+        """啟動代理（背景執行緒接受連線）"""
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._apply_mss(self.listener)
+        self.listener.bind((self.listen_host, self.listen_port))
+        self.listener.listen(128)
+        self.is_running = True
+
+        self.accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self.accept_thread.start()
+
+        p = self.profile
+        print("=" * 60)
+        print("[PROXY] 網路劣化代理已啟動")
+        print("=" * 60)
+        print(f"監聽:          {self.listen_host}:{self.listen_port}")
+        print(f"目標:          {self.target_host}:{self.target_port}")
+        print(f"RTT / 抖動:    {p['rtt']} ms / {p['jitter']} ms")
+        print(f"遺失率:        {p['loss']:.2%}")
+        print(f"頻寬:          {p['bandwidth'] or '不限制'} kbps")
+        print(f"MSS / cwnd:    {p['mss']} bytes / {p['init_cwnd']} 分段")
+        print("=" * 60)
+
+    def stop(self):
+        """停止代理並關閉所有連線"""
+        if not self.is_running:
+            return
+        self.is_running = False
+
+        try:
+            self.listener.close()
+        except OSError:
+            pass
+
+        for link in list(self.links):
+            link.close()
+
+        print("[OK] 網路劣化代理已停止")
+        self.print_statistics()
+
+    def get_stats(self):
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def print_statistics(self):
+        stats = self.get_stats()
+        print(f"\n代理轉送統計:")
+        print(f"  連線數:         {stats['connections']}")
+        print(f"  上游連線錯誤:   {stats['upstream_errors']}")
+        print(f"  Client→Server:  {stats['bytes_client_to_server']:,} bytes")
+        print(f"  Server→Client:  {stats['bytes_server_to_client']:,} bytes")
+        print(f"  轉送分段:       {stats['segments']}")
+        print(f"  模擬遺失分段:   {stats['lost_segments']}")
+        print(f"  最大佇列延遲:   {stats['max_queue_delay'] * 1000:.1f} ms")
+
+    def _record(self, **values):
+        with self._stats_lock:
+            for key, value in values.items():
+                if key == 'max_queue_delay':
+                    self.stats[key] = max(self.stats[key], value)
+                else:
+                    self.stats[key] += value
+
+    def _apply_mss(self, sock):
+        # TCP_MAXSEG 僅部分平台支援，失敗時只靠應用層分段
+        if hasattr(socket, 'TCP_MAXSEG'):
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_MAXSEG, self.profile['mss'])
+            except OSError:
+                pass
+
+    def _accept_loop(self):
+        while self.is_running:
+            try:
+                client_sock, _ = self.listener.accept()
+            except OSError:
+                break
+
+            try:
+                server_sock = socket.create_connection((self.target_host, self.target_port), timeout=10)
+                server_sock.settimeout(None)
+            except OSError as e:
+                print(f"[WARN] 代理無法連線到 Server: {e}")
+                self._record(upstream_errors=1)
+                client_sock.close()
+                continue
+
+            self._record(connections=1)
+            link = _Link(self, client_sock, server_sock)
+            self.links.add(link)
+            link.start()
+
+
+class _Link:
+    """一條被代理的連線（兩個方向各一組 _Pipe）"""
+
+    def __init__(self, proxy, client_sock, server_sock):
+        self.proxy = proxy
+        self.sockets = (client_sock, server_sock)
+        for sock in self.sockets:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self.pipes = [
+            _Pipe(self, client_sock, server_sock, 'bytes_client_to_server'),
+            _Pipe(self, server_sock, client_sock, 'bytes_server_to_client'),
+        ]
+        self._remaining = len(self.pipes)
+        self._lock = threading.Lock()
+
+    def start(self):
+        for pipe in self.pipes:
+            pipe.start()
+
+    def pipe_finished(self):
+        with self._lock:
+            self._remaining -= 1
+            done = self._remaining == 0
+        if done:
+            self.close()
+
+    def close(self):
+        for sock in self.sockets:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self.proxy.links.discard(self)
+
+
+class _Pipe:
+    """
+    單一方向的轉送：reader 執行緒切分並排程分段，writer 執行緒依排程時間送出
+
+    排程狀態（頻寬、cwnd、順序）只由 reader 執行緒更新。
+    """
+
+    def __init__(self, link, src, dst, byte_counter):
+        self.link = link
+        self.src = src
+        self.dst = dst
+        self.byte_counter = byte_counter
+        self.queue = queue.Queue()
+
+        profile = link.proxy.profile
+        self.one_way = profile['rtt'] / 2000
+        self.jitter = profile['jitter'] / 1000
+        self.rtt = profile['rtt'] / 1000
+        self.loss = profile['loss']
+        self.mss = profile['mss']
+        self.init_cwnd = profile['init_cwnd']
+        self.rto = (profile['rto'] or max(200, 2 * profile['rtt'])) / 1000
+        bandwidth = profile['bandwidth']
+        self.bytes_per_sec = bandwidth * 1000 / 8 if bandwidth else 0
+
+        self.link_free = 0.0
+        self.last_release = 0.0
+        self.cwnd = self.init_cwnd
+        self.round_start = None
+        self.round_sent = 0
+
+    def start(self):
+        threading.Thread(target=self._reader, daemon=True).start()
+        threading.Thread(target=self._writer, daemon=True).start()
+
+    def _schedule(self, size, now):
+        """計算分段的送達時間"""
+        departure = max(now, self.link_free)
+
+        # slow start：每個 RTT 最多送出 cwnd 個分段，閒置超過 RTO 後重置；
+        # 只有上一輪填滿視窗時 cwnd 才加倍（應用受限時不增長）
+        if self.rtt > 0:
+            if self.round_start is None or departure - self.round_start > self.rtt + self.rto:
+                self.round_start = departure
+                self.round_sent = 0
+                self.cwnd = self.init_cwnd
+            elif departure >= self.round_start + self.rtt:
+                if self.round_sent >= self.cwnd:
+                    self.cwnd *= 2
+                self.round_start = departure
+                self.round_sent = 0
+            if self.round_sent >= self.cwnd:
+                departure = self.round_start + self.rtt
+                self.round_start = departure
+                self.round_sent = 0
+                self.cwnd *= 2
+            self.round_sent += 1
+
+        if self.bytes_per_sec:
+            departure += size / self.bytes_per_sec
+        self.link_free = departure
+
+        delay = self.one_way
+        if self.jitter:
+            delay = max(0.0, delay + random.uniform(-self.jitter, self.jitter))
+
+        lost = self.loss > 0 and random.random() < self.loss
+        if lost:
+            delay += self.rto
+
+        # TCP 依序交付：抖動不得造成重排
+        release = max(departure + delay, self.last_release)
+        self.last_release = release
+        return release, lost
+
+    def _reader(self):
+        proxy = self.link.proxy
+        try:
+            while True:
+                data = self.src.recv(65536)
+                if not data:
+                    break
+                now = time.perf_counter()
+                lost_count = 0
+                release = now
+                for offset in range(0, len(data), self.mss):
+                    segment = data[offset:offset + self.mss]
+                    release, lost = self._schedule(len(segment), now)
+                    lost_count += lost
+                    self.queue.put((release, segment))
+                proxy._record(**{
+                    self.byte_counter: len(data),
+                    'segments': -(-len(data) // self.mss),
+                    'lost_segments': lost_count,
+                    'max_queue_delay': release - now,
+                })
+        except OSError:
+            pass
+        self.queue.put(None)
+
+    def _writer(self):
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    self.dst.shutdown(socket.SHUT_WR)
+                    break
+                release, segment = item
+                wait = release - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                self.dst.sendall(segment)
+        except OSError:
+            # 對端已關閉：關閉整條連線讓另一方向的 reader 結束
+            self.link.close()
+        self.link.pipe_finished()
@@ -1,40 +1,189 @@
+import base64
+import functools
+import re
 import subprocess
+import threading
+import time
 from utils.settings import settings
+from utils import metrics
+from utils.profiler import profiler
+from utils.tls_options import record_layer_args
+from utils.cpu_usage import process_cpu_seconds
+from utils.socket_ports import local_port
 import os
 
+_HANDSHAKE_BYTES_RE = re.compile(r'SSL handshake has read (\d+) bytes and written (\d+) bytes')
+_NEGOTIATED_GROUP_RE = re.compile(r'(?:Negotiated TLS1\.3 group|Server Temp Key):\s*([^,\s]+)')
+_PEER_SIGNATURE_RE = re.compile(r'Peer signature type:\s*(\S+)')
+_HTTP_STATUS_RE = re.compile(r'HTTP/1\.[01] (\d{3})')
+_CIPHER_RE = re.compile(r'Cipher is (\S+)')
+# Linux：ECONNREFUSED (111)；Windows：WSAECONNREFUSED (10061)
+_CONNECT_REFUSED_RE = re.compile(
+    r'Connection refused|connect:errno=111\b|errno=10061\b|'
+    r'No connection could be made because the target machine actively refused it'
+)
+_VERIFY_ERROR_RE = re.compile(r'Verification error: (.+)')
+_ALERT_RE = re.compile(r'alert ([a-z][a-z ]*?):.*?SSL alert number (\d+)')
+
+# 各階段逾時（秒）：connect 到 TCP 連線建立、handshake 到握手完成、read 到回應讀取完畢
+DEFAULT_TIMEOUTS = {'connect': 5.0, 'handshake': 15.0, 'read': 60.0}
+
+
+class _OutputReader:
+    """
+    背景讀取 s_client 的 stdout / stderr，並標記連線進度
+
+    connected：stderr 出現 -state 的 write client hello（stdout 的 CONNECTED( 會被緩衝到握手後才輸出）；
+    handshake：stdout 出現協商出的 Cipher（非 (NONE)）。
+    兩個串流都結束（程序結束或被終止）時 closed 為 True。
+    connected_at / handshake_at / closed_at 記錄標記出現的時間（time.perf_counter）。
+    """
+
+    def __init__(self, process):
+        self.process = process
+        self.stdout = []
+        self.stderr = []
+        self.connected = False
+        self.handshake = False
+        self.connected_at = None
+        self.handshake_at = None
+        self.closed_at = None
+        self._open_streams = 2
+        self._cond = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._read, args=(process.stdout, self.stdout, True), daemon=True),
+            threading.Thread(target=self._read, args=(process.stderr, self.stderr, False), daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def closed(self):
+        return self._open_streams == 0
+
+    def _read(self, stream, lines, is_stdout):
+        try:
+            for line in stream:
+                with self._cond:
+                    lines.append(line)
+                    if is_stdout:
+                        if line.startswith('CONNECTED('):
+                            self._mark_connected()
+                        elif 'Cipher is' in line and '(NONE)' not in line and not self.handshake:
+                            self.handshake = True
+                            self.handshake_at = time.perf_counter()
+                    elif 'write client hello' in line:
+                        self._mark_connected()
+                    self._cond.notify_all()
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self._cond:
+                self._open_streams -= 1
+                if self._open_streams == 0:
+                    self.closed_at = time.perf_counter()
+                self._cond.notify_all()
+
+    def _mark_connected(self):
+        if not self.connected:
+            self.connected = True
+            self.connected_at = time.perf_counter()
+
+    def wait_for(self, marker, timeout):
+        """
+        等待進度標記
+
+        Returns:
+            True（標記出現）、False（輸出已結束仍未出現）或 None（逾時）
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not getattr(self, marker):
+                if self.closed:
+                    return False
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return True
+
+    def wait_closed(self, timeout):
+        """等待輸出結束；逾時回傳 False"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def output(self):
+        with self._cond:
+            return ''.join(self.stdout), ''.join(self.stderr)
+
+    def join(self, timeout=5):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def close(self):
+        for stream in (self.process.stdin, self.process.stdout, self.process.stderr):
+            try:
+                stream.close()
+            except (OSError, ValueError):
+                pass
+
+
+@functools.lru_cache(maxsize=None)
+def _cert_der_size(cert_file):
+    """PEM 憑證的 DER 大小（即握手 Certificate 訊息中的憑證位元組）"""
+    with open(cert_file, 'r', encoding='utf-8') as f:
+        body = ''.join(line.strip() for line in f if not line.startswith('-----'))
+    return len(base64.b64decode(body))
+
+
 class TLSClient:
-    def __init__(self, host='localhost', port=4433, kem_algorithm=None, sig_algorithm=None):
+    def __init__(self, host='localhost', port=4433, kem_algorithm=None, sig_algorithm=None, ca_file=None,
+                 cert_file=None, key_file=None, record=None, ciphersuites=None, timeouts=None):
+        """
+        Args:
+            kem_algorithm / sig_algorithm: 單一算法或列表（列表時全部提供給 Server 選擇）
+            ca_file: 驗證 Server 憑證用的 CA 檔案
+            cert_file / key_file: mTLS 的 Client 憑證與私鑰（未設定時不送出憑證）
+            record: 記錄層參數 {max_send_frag, split_send_frag, max_pipelines, read_buf}
+            ciphersuites: 提供的 TLS 1.3 cipher suite（字串或列表）
+            timeouts: 各階段逾時 {connect, handshake, read}（秒），未設定的項目使用 DEFAULT_TIMEOUTS
+        """
         self.host = host
         self.port = port
         self.kem_algorithm = kem_algorithm or settings.algorithms['default_kem']
         self.sig_algorithm = sig_algorithm or settings.algorithms['default_signature']
+        # 預設信任與 TLSServer 相同命名（server_{簽章算法}_cert.pem）的自簽憑證
+        primary_sig = self.sig_algorithm[0] if isinstance(self.sig_algorithm, (list, tuple)) else self.sig_algorithm
+        self.ca_file = ca_file or os.path.join(settings.cert['out_dir'], f'server_{primary_sig}_cert.pem')
+        self.cert_file = cert_file
+        self.key_file = key_file
+        self.record = record
+        self.ciphersuites = ciphersuites
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+
+    @property
+    def auth(self):
+        """驗證模式：mtls（送出 Client 憑證）或 server（僅 Server 驗證）"""
+        return 'mtls' if self.cert_file else 'server'
     
-    def connect(self, message=None, debug=False, keylog_file=None):
+    def build_command(self, debug=False, keylog_file=None, wait_response=False):
         """
-        連接到 TLS Server
-        
+        組出 openssl s_client 指令
+
         Args:
-            message: 要發送的訊息
-            debug: 是否顯示 debug 資訊（-state -msg）
-            keylog_file: 儲存 session keys 的檔案路徑
+            wait_response: 送完訊息後不因 stdin EOF 關閉連線，等 Server 回應並關閉（-ign_eof）
         """
         openssl = settings.get_openssl_cmd()
         provider_path = settings.paths['oqs_provider_dir']
 
-        kem = settings.get_algorithm(self.kem_algorithm)
-        sig = settings.get_algorithm(self.sig_algorithm)
-
-        print("=" * 60)
-        print(f"[CONNECT] 連接 PQC-TLS Server")
-        print("=" * 60)
-        print(f"目標:          {self.host}:{self.port}")
-        print(f"KEM 算法:      {kem}")
-        print(f"簽名算法:      {sig}")
-        if debug:
-            print(f"Debug 模式:    [ON]")
-        if keylog_file:
-            print(f"Keylog 檔案:   {keylog_file}")
-        print("=" * 60)
+        kem = settings.get_algorithm_list(self.kem_algorithm)
+        sig = settings.get_algorithm_list(self.sig_algorithm)
 
         cmd = [
             openssl, 's_client',
@@ -45,53 +194,306 @@ class TLSClient:
             '-provider-path', provider_path,
             '-provider', 'default',
             '-provider', 'oqsprovider',
-            '-CAfile', 'certs/server_cert.pem',
+            '-CAfile', self.ca_file,
+            '-verify_return_error',
         ]
+
+        if self.cert_file:
+            cmd.extend(['-cert', os.path.abspath(self.cert_file), '-key', os.path.abspath(self.key_file)])
+
+        cmd.extend(record_layer_args(self.record, self.ciphersuites))
+
+        if wait_response:
+            cmd.append('-ign_eof')
         
-        # Debug 模式
+        # Debug 模式（-state 也用於判斷 TCP 連線是否已建立）
         if debug:
             cmd.extend(['-state', '-msg'])
+        else:
+            cmd.append('-state')
         
         # Keylog
         if keylog_file:
             keylog_abs = os.path.abspath(keylog_file)
             os.makedirs(os.path.dirname(keylog_abs), exist_ok=True)
             cmd.extend(['-keylogfile', keylog_abs])
+
+        return cmd
+
+    def connect(self, message=None, debug=False, keylog_file=None, verbose=True, wait_response=False,
+                record_port=False):
+        """
+        連接到 TLS Server
         
-        print("\n正在連接...\n")
-        
+        Args:
+            message: 要發送的訊息
+            debug: 是否顯示 debug 資訊（-state -msg）
+            keylog_file: 儲存 session keys 的檔案路徑
+            verbose: 是否輸出連線資訊（高速率測試時關閉）
+            wait_response: 等待 Server 回應完整送達（下載模式）
+            record_port: 記錄 s_client 的本機埠（client_port），供對應 PCAP 中的 flow
+
+        Returns:
+            dict: success（是否完成握手）、duration（連線耗時，秒，含 s_client 啟動）、
+                  handshake_duration（TCP 連線建立到握手完成的秒數）、
+                  client_port（record_port 時 s_client 的本機埠，無法取得時為 None）、
+                  transfer_duration（握手完成到連線關閉的秒數）、
+                  transfer_cpu_seconds（同一區間 s_client 的 CPU 秒數，僅 wait_response，無法取得時為 None）、
+                  error（失敗類別）、handshake_bytes（握手讀寫位元組）、
+                  negotiated_group / peer_signature（協商出的算法）、
+                  auth（驗證模式）、client_cert_bytes（送出的 Client 憑證位元組）、
+                  cipher（協商出的 cipher suite）、response_status（HTTP 狀態碼）；
+                  失敗時另有 timeout_phase（connect / handshake / read）、
+                  alert {code, description} 或 verify_error
+        """
+        kem = settings.get_algorithm_list(self.kem_algorithm)
+        sig = settings.get_algorithm_list(self.sig_algorithm)
+
+        if verbose:
+            print("=" * 60)
+            print(f"[CONNECT] 連接 PQC-TLS Server")
+            print("=" * 60)
+            print(f"目標:          {self.host}:{self.port}")
+            print(f"KEM 算法:      {kem}")
+            print(f"簽名算法:      {sig}")
+            if self.cert_file:
+                print(f"Client 憑證:   {self.cert_file}")
+            if debug:
+                print(f"Debug 模式:    [ON]")
+            if keylog_file:
+                print(f"Keylog 檔案:   {keylog_file}")
+            print("=" * 60)
+
+        cmd = self.build_command(debug=debug, keylog_file=keylog_file, wait_response=wait_response)
+
+        if verbose:
+            print("\n正在連接...\n")
+
+        result = {
+            'success': False,
+            'duration': None,
+            'handshake_duration': None,
+            'client_port': None,
+            'transfer_duration': None,
+            'transfer_cpu_seconds': None,
+            'error': None,
+            'handshake_bytes': None,
+            'negotiated_group': None,
+            'peer_signature': None,
+            'auth': self.auth,
+            'client_cert_bytes': 0,
+            'cipher': None,
+            'response_status': None,
+        }
+        metrics.CONNECTIONS_STARTED.inc()
+        start = time.perf_counter()
+
+        process = None
+        reader = None
         try:
             if message:
-                process = subprocess.Popen(
-                    cmd,
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-                
-                stdout, stderr = process.communicate(input=message + "\n", timeout=120)
-                
-                print("連線成功！")
-                print("\n=== 握手資訊 ===")
-                for line in stderr.split('\n'):
-                    if any(keyword in line for keyword in ['Protocol', 'Cipher', 'Server Temp Key', 'Peer signing', 'Peer public key']):
-                        print(line)
-                
-                if stdout:
-                    print("\n=== Server 回應 ===")
-                    print(stdout[:500])
+                with profiler.span('spawn'):
+                    process = subprocess.Popen(
+                        cmd,
+                        stdin=subprocess.PIPE,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.PIPE,
+                        text=True
+                    )
+                    reader = _OutputReader(process)
+
+                # s_client 握手完成後才讀取 stdin；訊息大於管線緩衝時寫入會阻塞，
+                # 因此在背景執行緒寫入，避免在各階段計時開始前卡住
+                threading.Thread(target=self._write_stdin, args=(process, message + "\n"), daemon=True).start()
+
+                # 各階段分別計時：TCP 連線 → 握手完成 → 回應讀取完畢（s_client 結束輸出）
+                timeout_phase = None
+                with profiler.span('handshake'):
+                    state = reader.wait_for('connected', self.timeouts['connect'])
+                    if state is None:
+                        timeout_phase = 'connect'
+                    elif state:
+                        if record_port:
+                            result['client_port'] = local_port(process.pid, self.port)
+                        state = reader.wait_for('handshake', self.timeouts['handshake'])
+                        if state is None:
+                            timeout_phase = 'handshake'
+                if state:
+                    # 下載模式另外量測握手後（記錄層傳輸）的 s_client CPU；程序結束但尚未回收前仍可讀取
+                    cpu_at_handshake = process_cpu_seconds(process.pid) if wait_response else None
+                    with profiler.span('read'):
+                        if not reader.wait_closed(self.timeouts['read']):
+                            timeout_phase = 'read'
+                        elif cpu_at_handshake is not None:
+                            cpu_at_close = process_cpu_seconds(process.pid)
+                            if cpu_at_close is not None:
+                                result['transfer_cpu_seconds'] = cpu_at_close - cpu_at_handshake
+                if timeout_phase is None:
+                    try:
+                        process.wait(timeout=self.timeouts['read'])
+                    except subprocess.TimeoutExpired:
+                        timeout_phase = 'read'
+                result['duration'] = time.perf_counter() - start
+                if reader.connected_at is not None and reader.handshake_at is not None:
+                    result['handshake_duration'] = reader.handshake_at - reader.connected_at
+                if reader.handshake_at is not None and reader.closed_at is not None:
+                    result['transfer_duration'] = reader.closed_at - reader.handshake_at
+
+                if timeout_phase:
+                    self._kill(process)
+                    result['error'] = 'timeout'
+                    result['timeout_phase'] = timeout_phase
+
+                reader.join()
+                stdout, stderr = reader.output()
+
+                with profiler.span('parse'):
+                    output = stdout + stderr
+                    result['handshake_bytes'] = self._handshake_bytes(output)
+                    result['negotiated_group'] = self._search(_NEGOTIATED_GROUP_RE, output)
+                    result['peer_signature'] = self._search(_PEER_SIGNATURE_RE, output)
+                    result['cipher'] = self._search(_CIPHER_RE, output)
+                    status = self._search(_HTTP_STATUS_RE, stdout)
+                    result['response_status'] = int(status) if status else None
+                    if not result['error']:
+                        result['success'] = process.returncode == 0 and self._handshake_completed(output)
+                        if result['success'] and wait_response and result['response_status'] is None:
+                            result['success'] = False
+                        if not result['success']:
+                            result.update(self._classify_failure(output, reader.handshake))
+                if result['success'] and self.cert_file:
+                    result['client_cert_bytes'] = _cert_der_size(self.cert_file)
+                metrics.APP_BYTES_SENT.inc(len(message) + 1)
+
+                if verbose:
+                    if result['success']:
+                        print("連線成功！")
+                    else:
+                        print(f"[FAIL] {self.describe_error(result)}")
+                    print("\n=== 握手資訊 ===")
+                    for line in stderr.split('\n'):
+                        if any(keyword in line for keyword in ['Protocol', 'Cipher', 'Server Temp Key', 'Peer signing', 'Peer public key']):
+                            print(line)
+
+                    if stdout:
+                        print("\n=== Server 回應 ===")
+                        print(stdout[:500])
                 
             else:
                 process = subprocess.Popen(cmd)
                 process.wait()
+                result['duration'] = time.perf_counter() - start
+                result['success'] = process.returncode == 0
+                if not result['success']:
+                    result['error'] = 'handshake_failed'
                 
-        except subprocess.TimeoutExpired:
-            print("[TIMEOUT] 連線超時")
         except KeyboardInterrupt:
             print("\n\n[WARN] 連線中斷")
+            result['error'] = 'interrupted'
         except Exception as e:
             print(f"[ERROR] 連線錯誤: {e}")
+            result['error'] = 'exception'
+        finally:
+            # 任何情況下都不留下 s_client 程序
+            if process is not None:
+                self._kill(process)
+            if reader is not None:
+                reader.join()
+                reader.close()
+
+        self._record_metrics(result)
+        return result
+
+    @staticmethod
+    def _write_stdin(process, data):
+        """寫入訊息並關閉 stdin；連線失敗或程序被終止時 stdin 可能已關閉"""
+        try:
+            process.stdin.write(data)
+            process.stdin.close()
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def _kill(process):
+        if process.poll() is None:
+            process.kill()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+
+    @staticmethod
+    def _classify_failure(output, handshake_done):
+        """
+        依 s_client 輸出分類失敗原因
+
+        Returns:
+            dict: error（refused / verify_failed / handshake_alert / truncated_response / handshake_failed），
+                  以及 alert {code, description} 或 verify_error 等細節
+        """
+        if _CONNECT_REFUSED_RE.search(output):
+            return {'error': 'refused'}
+
+        verify = _VERIFY_ERROR_RE.search(output)
+        if verify or 'certificate verify failed' in output:
+            return {'error': 'verify_failed', 'verify_error': verify.group(1).strip() if verify else None}
+
+        alert = _ALERT_RE.search(output)
+        if alert:
+            return {
+                'error': 'handshake_alert',
+                'alert': {'code': int(alert.group(2)), 'description': alert.group(1)},
+            }
+
+        # 握手已完成但連線異常結束，或等待回應時沒收到完整回應
+        if handshake_done:
+            return {'error': 'truncated_response'}
+        return {'error': 'handshake_failed'}
+
+    @staticmethod
+    def describe_error(result):
+        """失敗原因的簡短說明（供模式輸出）"""
+        error = result.get('error')
+        if error == 'timeout':
+            return f"timeout ({result.get('timeout_phase')})"
+        if error == 'handshake_alert' and result.get('alert'):
+            return f"handshake_alert {result['alert']['code']} ({result['alert']['description']})"
+        if error == 'verify_failed' and result.get('verify_error'):
+            return f"verify_failed ({result['verify_error']})"
+        return error or 'unknown'
+
+    @staticmethod
+    def _record_metrics(result):
+        auth = result['auth']
+        if result['success']:
+            metrics.CONNECTIONS_SUCCEEDED.inc()
+            metrics.CONNECTION_DURATION.labels(auth=auth).observe(result['duration'])
+            if result['handshake_duration'] is not None:
+                metrics.HANDSHAKE_LATENCY.labels(auth=auth).observe(result['handshake_duration'])
+            metrics.CLIENT_CERT_BYTES.inc(result['client_cert_bytes'])
+        else:
+            metrics.CONNECTIONS_FAILED.labels(error=result['error']).inc()
+
+        if result['handshake_bytes']:
+            metrics.HANDSHAKE_BYTES_READ.labels(auth=auth).inc(result['handshake_bytes']['read'])
+            metrics.HANDSHAKE_BYTES_WRITTEN.labels(auth=auth).inc(result['handshake_bytes']['written'])
+
+    @staticmethod
+    def _search(pattern, output):
+        match = pattern.search(output)
+        return match.group(1) if match else None
+
+    @staticmethod
+    def _handshake_bytes(output):
+        match = _HANDSHAKE_BYTES_RE.search(output)
+        if not match:
+            return None
+        return {'read': int(match.group(1)), 'written': int(match.group(2))}
+
+    @staticmethod
+    def _handshake_completed(output):
+        """s_client 握手成功時會輸出協商出的 Cipher，失敗時為 (NONE)"""
+        return 'Cipher is' in output and 'Cipher is (NONE)' not in output
 
 if __name__ == "__main__":
     client = TLSClient()
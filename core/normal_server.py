@@ -2,26 +2,135 @@ import os
 import subprocess
 from utils.settings import settings
 from utils.cert_manager import CertManager
+from utils.tls_options import record_layer_args
 
 class TLSServer:
-    def __init__(self, port=4433, kem_algorithm=None, sig_algorithm=None):
+    # s_server 最多支援兩組憑證（-cert 與 -dcert），依 Client 的 signature_algorithms 選擇
+    MAX_CERTIFICATES = 2
+
+    def __init__(self, port=4433, kem_algorithm=None, sig_algorithm=None, cert_chain=None, client_auth=None,
+                 record=None, ciphersuites=None):
+        """
+        Args:
+            port: 監聽埠
+            kem_algorithm: KEM 算法，或多個算法的列表（全部透過 -groups 公告）
+            sig_algorithm: 簽章算法，或多個算法的列表（每個算法各一組憑證）
+            cert_chain: 由 root 到 leaf 的簽章算法列表；設定時主憑證改用
+                        CertManager.build_chain 產生的憑證鏈（leaf 算法取代第一個簽章算法）
+            client_auth: 啟用 mTLS 時的設定 {algorithm, ca_algorithm, clients, required}；
+                         Server 以 Client CA 驗證 Client 憑證，required 為 false 時
+                         未提供憑證的 Client 仍可完成握手
+            record: 記錄層參數 {max_send_frag, split_send_frag, max_pipelines, read_buf}
+            ciphersuites: 允許的 TLS 1.3 cipher suite（字串或列表）
+        """
         self.port = port
-        self.kem_algorithm = kem_algorithm or settings.algorithms['default_kem']
-        self.sig_algorithm = sig_algorithm or settings.algorithms['default_signature']
+        self.kem_algorithms = self._as_list(kem_algorithm or settings.algorithms['default_kem'])
+        self.sig_algorithms = self._as_list(sig_algorithm or settings.algorithms['default_signature'])
+        self.cert_chain = list(cert_chain) if cert_chain else None
+        self.record = dict(record or {})
+        self.ciphersuites = ciphersuites
+        if self.cert_chain:
+            leaf = self.cert_chain[-1]
+            self.sig_algorithms = [leaf] + [sig for sig in self.sig_algorithms[1:] if sig != leaf]
+        self.kem_algorithm = self.kem_algorithms[0]
+        self.sig_algorithm = self.sig_algorithms[0]
         self.process = None
+
+        if len(self.sig_algorithms) > self.MAX_CERTIFICATES:
+            print(f"[WARN] s_server 最多支援 {self.MAX_CERTIFICATES} 組憑證，"
+                  f"忽略: {', '.join(self.sig_algorithms[self.MAX_CERTIFICATES:])}")
+            self.sig_algorithms = self.sig_algorithms[:self.MAX_CERTIFICATES]
         
         self.cert_manager = CertManager()
-        self.key_file = os.path.join(settings.cert['out_dir'], 'server_key.pem')
-        self.cert_file = os.path.join(settings.cert['out_dir'], 'server_cert.pem')
+        # 憑證以算法命名，不同實驗切換簽章算法時不會沿用其他算法的憑證
+        self.key_file, self.cert_file = self.cert_paths(self.sig_algorithm)
+        self.chain_file = None
+        self.root_file = None
+
+        self.client_auth = dict(client_auth) if client_auth else None
+        self.client_ca_file = None
+        self.client_certs = []
+
+        self.extra_certs = [(sig, *self.cert_paths(sig)) for sig in self.sig_algorithms[1:]]
         
         self._ensure_certificates()
+        self.ca_file = self._build_ca_file()
+        if self.client_auth:
+            self._ensure_client_certificates()
+
+    @staticmethod
+    def _as_list(value):
+        return list(value) if isinstance(value, (list, tuple)) else [value]
+
+    @staticmethod
+    def cert_paths(sig_algorithm):
+        """指定簽章算法的自簽 Server 憑證路徑 (key_file, cert_file)"""
+        return (os.path.join(settings.cert['out_dir'], f'server_{sig_algorithm}_key.pem'),
+                os.path.join(settings.cert['out_dir'], f'server_{sig_algorithm}_cert.pem'))
     
+    @property
+    def client_sig_algorithms(self):
+        """
+        Client 應提供的簽章算法
+
+        OpenSSL 會以 Client 的 signature_algorithms 檢查 leaf 憑證本身的簽章，
+        因此使用憑證鏈時需一併提供鏈上各層的算法。
+        """
+        algorithms = list(self.sig_algorithms)
+        for sig in reversed(self.cert_chain or []):
+            if sig not in algorithms:
+                algorithms.append(sig)
+        return algorithms
+
     def _ensure_certificates(self):
-        if not os.path.exists(self.key_file) or not os.path.exists(self.cert_file):
-            print("[WARN] 憑證不存在，開始生成...")
-            self.cert_manager.generate_server_cert(algorithm=self.sig_algorithm)
+        if self.cert_chain:
+            chain = self.cert_manager.build_chain(self.cert_chain)
+            self.key_file = chain['key_file']
+            self.cert_file = chain['cert_file']
+            self.chain_file = chain['chain_file']
+            self.root_file = chain['ca_file']
+        elif not os.path.exists(self.key_file) or not os.path.exists(self.cert_file):
+            print(f"[WARN] {self.sig_algorithm} 憑證不存在，開始生成...")
+            self.cert_manager.generate_server_cert(algorithm=self.sig_algorithm, name=f'server_{self.sig_algorithm}')
         else:
-            print("[OK] 使用現有憑證")
+            print(f"[OK] 使用現有 {self.sig_algorithm} 憑證")
+
+        for sig, key_file, cert_file in self.extra_certs:
+            if not os.path.exists(key_file) or not os.path.exists(cert_file):
+                print(f"[WARN] {sig} 憑證不存在，開始生成...")
+                self.cert_manager.generate_server_cert(algorithm=sig, name=f'server_{sig}')
+
+    @property
+    def client_cert_algorithms(self):
+        """Server 在 CertificateRequest 中接受的簽章算法（Client 憑證與 Client CA）"""
+        algorithms = [self.client_auth['algorithm']]
+        ca_algorithm = self.client_auth.get('ca_algorithm')
+        if ca_algorithm and ca_algorithm not in algorithms:
+            algorithms.append(ca_algorithm)
+        return algorithms
+
+    def _ensure_client_certificates(self):
+        self.client_auth.setdefault('algorithm', settings.algorithms['default_signature'])
+        issued = self.cert_manager.issue_client_certs(
+            algorithm=self.client_auth['algorithm'],
+            count=self.client_auth.get('clients', 1),
+            ca_algorithm=self.client_auth.get('ca_algorithm')
+        )
+        self.client_ca_file = issued['ca_file']
+        self.client_certs = issued['clients']
+
+    def _build_ca_file(self):
+        """Client 驗證用的 CA 檔案（多組自簽憑證時合併為 bundle）"""
+        primary = self.root_file or self.cert_file
+        if not self.extra_certs:
+            return primary
+
+        bundle_file = os.path.join(settings.cert['out_dir'], 'server_ca_bundle.pem')
+        with open(bundle_file, 'w', encoding='utf-8') as bundle:
+            for cert_file in [primary] + [cert for _, _, cert in self.extra_certs]:
+                with open(cert_file, 'r', encoding='utf-8') as f:
+                    bundle.write(f.read())
+        return bundle_file
     
     def start(self, debug=False, keylog_file=None):
         """
@@ -34,8 +143,8 @@ class TLSServer:
         openssl = settings.get_openssl_cmd()
         provider_path = settings.paths['oqs_provider_dir']
 
-        kem = settings.get_algorithm(self.kem_algorithm)
-        sig = settings.get_algorithm(self.sig_algorithm)
+        kem = settings.get_algorithm_list(self.kem_algorithms)
+        sig = settings.get_algorithm_list(self.client_sig_algorithms)
 
         print("=" * 60)
         print(f"[START] 啟動 PQC-TLS Server")
@@ -45,6 +154,18 @@ class TLSServer:
         print(f"簽章算法:      {sig}")
         print(f"憑證:          {self.cert_file}")
         print(f"私鑰:          {self.key_file}")
+        if self.cert_chain:
+            print(f"憑證鏈:        {' → '.join(self.cert_chain)}")
+        for extra_sig, _, extra_cert in self.extra_certs:
+            print(f"第二憑證:      {extra_cert} ({extra_sig})")
+        if self.client_auth:
+            mode = '必要' if self.client_auth.get('required', True) else '選用'
+            print(f"Client 驗證:   mTLS {mode} ({self.client_auth['algorithm']}, "
+                  f"{len(self.client_certs)} 張 Client 憑證)")
+        if self.record:
+            print(f"記錄層:        {self.record}")
+        if self.ciphersuites:
+            print(f"Cipher suites: {self.ciphersuites}")
         if debug:
             print(f"Debug 模式:    [ON]")
         if keylog_file:
@@ -67,7 +188,24 @@ class TLSServer:
             '-provider', 'oqsprovider',
             '-WWW',
         ]
+
+        if self.chain_file:
+            cmd.extend(['-cert_chain', os.path.abspath(self.chain_file)])
+
+        for _, extra_key, extra_cert in self.extra_certs:
+            cmd.extend(['-dcert', os.path.abspath(extra_cert), '-dkey', os.path.abspath(extra_key)])
+
+        # mTLS：-Verify 要求 Client 憑證，-verify 只請求；兩者驗證失敗都中止握手
+        if self.client_auth:
+            cmd.extend([
+                '-Verify' if self.client_auth.get('required', True) else '-verify', '1',
+                '-verify_return_error',
+                '-CAfile', os.path.abspath(self.client_ca_file),
+                '-client_sigalgs', settings.get_algorithm_list(self.client_cert_algorithms),
+            ])
         
+        cmd.extend(record_layer_args(self.record, self.ciphersuites))
+
         # Debug 模式
         if debug:
             cmd.extend(['-state', '-msg'])
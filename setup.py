@@ -15,5 +15,6 @@ setup(
         'pyyaml>=6.0',
         'requests>=2.31.0',
         'aiohttp>=3.8.0',
+        'psutil>=5.9.0',
     ],
 )
\ No newline at end of file
@@ -1,27 +1,115 @@
 import yaml
+import json
 import importlib
+import random
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from core.normal_server import TLSServer
+from core.impairment_proxy import ImpairmentProxy
 from utils.traffic_capture import TrafficCapture
+from utils.capacity_search import CapacitySearch
+from utils.metrics import metrics, MetricsServer
+from utils.stats import summarize_latencies, summarize_flood
+from utils.profiler import profiler
+from utils.checkpoint import Checkpoint
+from utils.benchmark import set_affinity, aggregate_repeats, print_aggregate
+from utils.cpu_usage import process_cpu_seconds
+from utils.record_sweep import (
+    record_grid, handshake_cpu_per_connection, transfer_summary, best_by_cipher, print_sweep_table
+)
 
 # python traffic_generator.py configs/experiments/exp_01_benign.yaml
 # python traffic_generator.py configs/experiments/exp_00_quick_test.yaml
+
+
+def merge_results(results):
+    """
+    合併多個模式結果（數值相加、列表串接、字典遞迴合併）
+
+    Args:
+        results: 各模式 execute() 回傳的 dict 列表
+    """
+    merged = {}
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        for key, value in result.items():
+            if isinstance(value, bool):
+                continue
+            if isinstance(value, (int, float)):
+                merged[key] = merged.get(key, 0) + value
+            elif isinstance(value, list):
+                merged.setdefault(key, []).extend(value)
+            elif isinstance(value, dict):
+                merged[key] = merge_results([merged.get(key, {}), value])
+    return merged
+
+
+def summarize_result(result):
+    """
+    將模式結果中的延遲列表轉為摘要，供輸出與寫入結果檔
+
+    latencies → latency、xxx_latencies → xxx_latency；flood 視窗在此（合併之後）才計算速率與 CPU 使用率
+    """
+    summary = {}
+    for key, value in result.items():
+        if key == 'latencies':
+            summary['latency'] = summarize_latencies(value)
+        elif key.endswith('_latencies'):
+            summary[key[:-len('latencies')] + 'latency'] = summarize_latencies(value)
+        elif key == 'flood' and isinstance(value, list):
+            summary[key] = summarize_flood(value)
+        elif key == 'branches':
+            summary[key] = [
+                {**branch, 'result': summarize_result(branch['result'])} if 'result' in branch else branch
+                for branch in value
+            ]
+        elif isinstance(value, dict):
+            summary[key] = summarize_result(value)
+        else:
+            summary[key] = value
+    return summary
+
+
+def compact_result(result, max_items=10):
+    """輸出用的精簡結果：較長的列表（如 negotiations）只顯示項目數"""
+    compact = {}
+    for key, value in result.items():
+        if isinstance(value, list) and len(value) > max_items:
+            compact[key] = f"<{len(value)} 項>"
+        elif isinstance(value, list):
+            compact[key] = [compact_result(item, max_items) if isinstance(item, dict) else item for item in value]
+        elif isinstance(value, dict):
+            compact[key] = compact_result(value, max_items)
+        else:
+            compact[key] = value
+    return compact
+
+
 class TrafficGenerator:
     def __init__(self, patterns_file='configs/traffic_patterns.yaml'):
         self.patterns_file = patterns_file
         self.patterns = self.load_patterns()
         self.server = None
         self.server_thread = None
+        self.server_overrides = {}
         self.capture = None
+        self.capture_segments = []
+        self.run_stem = None
+        self.proxy = None
+        self.proxy_stats = None
+        self.metrics_server = None
+        self.affinity = {}
 
         self.attack_classes = {
             'web_browsing': 'attacks.benign.simple_traffic.SimpleTraffic',
             'video_streaming': 'attacks.benign.simple_traffic.SimpleTraffic',
             'file_download': 'attacks.benign.simple_traffic.SimpleTraffic',
             'gaming': 'attacks.benign.simple_traffic.SimpleTraffic',
+            'handshake_flood': 'attacks.dos.handshake_flood.HandshakeFlood',
         }
 
     def load_patterns(self):
@@ -44,17 +132,30 @@ class TrafficGenerator:
         module = importlib.import_module(module_path)
         return getattr(module, class_name)
 
-    def start_server(self):
-        server_config = self.patterns.get('server', {})
+    def start_server(self, overrides=None):
+        server_config = dict(self.patterns.get('server', {}))
+        if overrides:
+            server_config.update(overrides)
+        self.server_overrides = dict(overrides or {})
         port = server_config.get('port', 4433)
         kem_algorithm = server_config.get('kem_algorithm', 'mlkem768')
         sig_algorithm = server_config.get('sig_algorithm', 'mldsa65')
+        cert_chain = server_config.get('cert_chain')
+        client_auth = server_config.get('client_auth')
+        record = server_config.get('record')
+        ciphersuites = server_config.get('ciphersuites')
         keylog_file = server_config.get('keylog_file', None)
 
         print(f"\n啟動 PQC-TLS Server...")
         print(f"  Port: {port}")
         print(f"  KEM: {kem_algorithm}")
         print(f"  Signature: {sig_algorithm}")
+        if cert_chain:
+            print(f"  Cert chain: {' → '.join(cert_chain)}")
+        if client_auth:
+            print(f"  Client auth: mTLS ({client_auth.get('algorithm', sig_algorithm)})")
+        if record:
+            print(f"  Record: {record}")
         if keylog_file:
             print(f"  Keylog: {keylog_file}")
         print()
@@ -62,7 +163,11 @@ class TrafficGenerator:
         self.server = TLSServer(
             port=port,
             kem_algorithm=kem_algorithm,
-            sig_algorithm=sig_algorithm
+            sig_algorithm=sig_algorithm,
+            cert_chain=cert_chain,
+            client_auth=client_auth,
+            record=record,
+            ciphersuites=ciphersuites
         )
 
         self.server_thread = threading.Thread(
@@ -76,6 +181,9 @@ class TrafficGenerator:
         time.sleep(2)
         print("Server 已啟動\n")
 
+        if self.affinity.get('server') and self.server.process:
+            set_affinity(self.server.process.pid, self.affinity['server'], 'Server')
+
     def stop_server(self):
         if self.server:
             print("\n停止 Server...")
@@ -83,13 +191,92 @@ class TrafficGenerator:
             self.server = None
             self.server_thread = None
 
-    def start_capture(self, experiment_name):
+    def start_proxy(self, network):
+        """
+        啟動網路劣化代理，Client 改連代理埠
+
+        Args:
+            network: network_profiles 中的 profile 名稱，
+                     或 {profile: 名稱, 參數: 覆寫值} 的 dict
+        """
+        if isinstance(network, str):
+            network = {'profile': network}
+
+        profile = {}
+        profile_name = network.get('profile')
+        if profile_name:
+            profiles = self.patterns.get('network_profiles', {})
+            if profile_name not in profiles:
+                raise ValueError(f"找不到網路 profile: {profile_name}")
+            profile.update(profiles[profile_name])
+        profile.update({k: v for k, v in network.items() if k not in ('profile', 'listen_port')})
+
+        proxy_config = self.patterns.get('proxy', {})
+        listen_port = network.get('listen_port', proxy_config.get('listen_port', 5433))
+        server_port = self.patterns.get('server', {}).get('port', 4433)
+
+        print(f"\n啟動網路劣化代理 (profile: {profile_name or 'custom'})...")
+        self.proxy = ImpairmentProxy(
+            listen_port=listen_port,
+            target_host='localhost',
+            target_port=server_port,
+            profile=profile
+        )
+        self.proxy.start()
+
+    def stop_proxy(self):
+        if self.proxy:
+            print("\n停止網路劣化代理...")
+            self.proxy.stop()
+            self.proxy_stats = self.proxy.get_stats()
+            self.proxy = None
+
+    def client_server_config(self, overrides=None):
+        """Client 端使用的 server 設定（啟用代理時改連代理埠）"""
+        server_config = dict(self.patterns.get('server', {}))
+        server_config.update(self.server_overrides)
+        if overrides:
+            server_config.update(overrides)
+        server_config['host'] = 'localhost'
+        if self.proxy:
+            server_config['port'] = self.proxy.listen_port
+        if self.server:
+            server_config['ca_file'] = self.server.ca_file
+            if self.server.cert_chain:
+                # 使用憑證鏈時，Client 需一併提供鏈上各層的簽章算法
+                offered = self.server.client_sig_algorithms
+                preferred = (overrides or {}).get('sig_algorithm')
+                if preferred:
+                    offered = [preferred] + [sig for sig in offered if sig != preferred]
+                server_config['sig_algorithm'] = offered
+            if self.server.client_certs:
+                server_config['client_certs'] = self.server.client_certs
+            if self.server.process:
+                server_config['server_pid'] = self.server.process.pid
+        return server_config
+
+    def server_supports(self, overrides):
+        """目前 Server 是否已公告指定的 KEM / 簽章算法（可免重啟）"""
+        if not self.server:
+            return False
+        if overrides.get('kem_algorithm', self.server.kem_algorithm) not in self.server.kem_algorithms:
+            return False
+        if overrides.get('sig_algorithm', self.server.sig_algorithm) not in self.server.sig_algorithms:
+            return False
+        if 'cert_chain' in overrides and list(overrides['cert_chain']) != (self.server.cert_chain or []):
+            return False
+        return True
+
+    def start_capture(self, run_stem, segmented=False):
         capture_config = self.patterns.get('capture', {})
         if not capture_config.get('enabled', False):
             return
 
-        server_config = self.patterns.get('server', {})
-        port = server_config.get('port', 4433)
+        # 啟用代理時捕獲 Client 端（已劣化）的連線
+        if self.proxy:
+            port = self.proxy.listen_port
+        else:
+            port = self.patterns.get('server', {}).get('port', 4433)
         output_dir = capture_config.get('output_dir', 'data/pcaps')
         interface = capture_config.get('interface', None)
 
@@ -99,8 +286,7 @@ class TrafficGenerator:
         if interface:
             print(f"  介面: {interface}")
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.pcap_filename = f"{experiment_name}_{timestamp}.pcap"
+        self.pcap_filename = f"{run_stem}.pcap"
 
         self.capture = TrafficCapture(
             port=port,
@@ -109,12 +295,13 @@ class TrafficGenerator:
         )
 
         self.capture.output_file = f"{output_dir}/{self.pcap_filename}"
+        self.capture.segmented = segmented
 
         self.capture.is_capturing = True
         kwargs = {
             'filter': f'tcp port {port}',
             'prn': self.capture._packet_callback,
-            'store': True
+            'store': not segmented
         }
         if interface:
             kwargs['iface'] = interface
@@ -123,13 +310,39 @@ class TrafficGenerator:
         self.capture.sniffer = AsyncSniffer(**kwargs)
         self.capture.sniffer.start()
 
-        time.sleep(1)
-        print(f"  PCAP: {self.pcap_filename}\n")
+        if self.affinity.get('capture') and self.capture.sniffer.thread:
+            set_affinity(self.capture.sniffer.thread.native_id, self.affinity['capture'], 'Capture')
 
-    def stop_capture(self):
+        time.sleep(1)
+        if segmented:
+            print(f"  PCAP 分段: {run_stem}_segNNN.pcap\n")
+        else:
+            print(f"  PCAP: {self.pcap_filename}\n")
+
+    def rotate_capture(self, suffix=''):
+        """分段模式下，將目前累積的封包寫成下一個 PCAP 分段"""
+        if not (self.capture and self.capture.segmented):
+            return None
+
+        index = len(self.capture_segments) + 1
+        output_file = f"{self.capture.output_dir}/{self.run_stem}_seg{index:03d}{suffix}.pcap"
+        segment = self.capture.rotate(output_file)
+        if segment and not suffix:
+            self.capture_segments.append(segment)
+        return segment
+
+    def stop_capture(self, incomplete=False):
+        """
+        停止封包捕獲
+
+        Args:
+            incomplete: 實驗中途失敗；分段模式下最後一段標記為 _incomplete，
+                        不列入檢查點（該步驟會在 --resume 時重跑）
+        """
         if self.capture and self.capture.is_capturing:
             print("\n停止封包捕獲...")
             self.capture.stop()
+            self.rotate_capture('_incomplete' if incomplete else '')
             self.capture = None
 
     def generate_pattern(self, pattern_name, override=None):
@@ -137,57 +350,454 @@ class TrafficGenerator:
             raise ValueError(f"找不到模式: {pattern_name}")
 
         pattern = self.patterns['patterns'][pattern_name].copy()
+        pattern_timeouts = pattern.get('timeouts', {})
 
         if override:
             pattern.update(override)
 
-        server_config = self.patterns.get('server', {})
-        server_config['host'] = 'localhost'
+        # 逾時設定逐項合併：全域 timeouts → 模式定義 → override
+        pattern['timeouts'] = {
+            **self.patterns.get('timeouts', {}),
+            **pattern_timeouts,
+            **((override or {}).get('timeouts') or {}),
+        }
+
+        server_config = self.client_server_config()
 
         AttackClass = self.load_attack_class(pattern_name)
         attack = AttackClass(pattern, server_config)
 
         return attack.execute()
 
-    def run_experiment(self, experiment_file):
+    def run_step(self, seq):
+        """
+        執行單一序列步驟
+
+        Args:
+            seq: 一般步驟 {pattern, override} 或並行步驟 {parallel: [...]}
+        """
+        if 'parallel' in seq:
+            return self.run_parallel(seq['parallel'])
+
+        pattern_name = seq['pattern']
+        override = seq.get('override')
+
+        print(f"\n執行模式: {pattern_name}")
+        if override:
+            print(f"覆寫參數: {override}")
+
+        return self.generate_pattern(pattern_name, override)
+
+    def run_benchmark_step(self, seq, benchmark):
+        """
+        以 benchmark 模式執行步驟：先跑 warmup 次（結果捨棄），再重複 repeats 次
+
+        Returns:
+            dict: warmup 次數、逐次結果，以及各數值欄位的平均、信賴區間與高變異標記
+        """
+        warmup = benchmark.get('warmup', 1)
+        repeats = benchmark.get('repeats', 5)
+        cooldown = benchmark.get('cooldown', 0)
+        confidence = benchmark.get('confidence', 0.95)
+
+        for i in range(warmup):
+            print(f"\n[WARMUP] {i + 1}/{warmup}（結果捨棄）")
+            self.run_step(seq)
+            if cooldown > 0:
+                time.sleep(cooldown)
+
+        runs = []
+        for i in range(repeats):
+            print(f"\n[REPEAT] {i + 1}/{repeats}")
+            runs.append(summarize_result(self.run_step(seq)))
+            if cooldown > 0 and i < repeats - 1:
+                time.sleep(cooldown)
+
+        stats = aggregate_repeats(runs, confidence, benchmark.get('cv_threshold', 0.1))
+        print_aggregate(stats, confidence)
+        return {'warmup': warmup, 'stats': stats, 'repeats': runs}
+
+    def benchmark_config(self, experiment, enabled=False):
+        """
+        合併 traffic_patterns.yaml 的 benchmark 預設值與實驗配置
+
+        實驗配置中 benchmark: true 或為 dict，或 enabled=True（--benchmark）時啟用；
+        未啟用時回傳 None。
+        """
+        override = experiment.get('benchmark')
+        if not override and not enabled:
+            return None
+
+        benchmark = dict(self.patterns.get('benchmark', {}))
+        if isinstance(override, dict):
+            affinity = {**benchmark.get('affinity', {}), **override.get('affinity', {})}
+            benchmark.update(override)
+            benchmark['affinity'] = affinity
+        return benchmark
+
+    def run_parallel(self, branches):
+        """
+        並行執行多個分支，全部完成後合併結果
+
+        每個分支各自排程（自己的 override 與 delay 起始延遲），
+        由執行緒池同時驅動，讓捕獲到的流量真正交錯。
+
+        Args:
+            branches: 分支列表，格式同一般步驟，另可指定 delay（秒）
+        """
+        self.validate_parallel(branches)
+        names = [branch.get('pattern', 'parallel') for branch in branches]
+        print(f"\n並行執行 {len(branches)} 個分支: {', '.join(names)}")
+
+        start = time.time()
+        branch_results = []
+        with ThreadPoolExecutor(max_workers=len(branches), thread_name_prefix='branch') as executor:
+            futures = [executor.submit(self._run_branch, branch) for branch in branches]
+            for name, future in zip(names, futures):
+                try:
+                    branch_results.append(future.result())
+                except Exception as e:
+                    print(f"[ERROR] 分支 {name} 失敗: {e}")
+                    branch_results.append({'pattern': name, 'error': str(e)})
+
+        merged = merge_results([branch['result'] for branch in branch_results if 'result' in branch])
+        merged['elapsed'] = round(time.time() - start, 3)
+        merged['branches'] = branch_results
+        return merged
+
+    @staticmethod
+    def validate_parallel(branches):
+        """並行步驟至少需要一個分支"""
+        if not isinstance(branches, list) or not branches:
+            raise ValueError("parallel 步驟需要至少一個分支（格式: parallel: [{pattern: ...}, ...]）")
+
+    def _run_branch(self, branch):
+        delay = branch.get('delay', 0)
+        if delay > 0:
+            time.sleep(delay)
+
+        start = time.time()
+        result = self.run_step(branch)
+        return {
+            'pattern': branch.get('pattern', 'parallel'),
+            'result': result,
+            'elapsed': round(time.time() - start, 3),
+        }
+
+    def run_capacity_search(self, search_config, completed=None, on_result=None):
+        """
+        依序對每組 KEM/簽章設定執行容量搜尋
+
+        Server 已公告該組算法時直接沿用（多 group / 多憑證 Server），
+        否則在實驗的 server 設定上套用對應算法重新啟動 Server（保留 client_auth、record 等設定），
+        結束後以原本的設定重啟 Server。回傳各組的 knee 與量測曲線。
+
+        Args:
+            completed: 已完成的結果（從檢查點繼續時跳過這些設定）
+            on_result: 每完成一組設定後呼叫 on_result(results)
+        """
+        algorithms = search_config.get('algorithms') or [{}]
+        results = list(completed or [])
+        base_overrides = dict(self.server_overrides)
+        restarted = False
+
+        for algorithm in algorithms[len(results):]:
+            overrides = {}
+            if 'kem' in algorithm:
+                overrides['kem_algorithm'] = algorithm['kem']
+            if 'sig' in algorithm:
+                overrides['sig_algorithm'] = algorithm['sig']
+            if 'chain' in algorithm:
+                overrides['cert_chain'] = algorithm['chain']
+
+            if not self.server_supports(overrides):
+                self.stop_server()
+                self.start_server({**base_overrides, **overrides})
+                restarted = True
+
+            server_config = self.client_server_config(overrides)
+
+            print("=" * 70)
+            print(f"容量搜尋: KEM={server_config.get('kem_algorithm')} "
+                  f"Signature={server_config.get('sig_algorithm')}")
+            print("=" * 70)
+
+            timeouts = {**self.patterns.get('timeouts', {}), **search_config.get('timeouts', {})}
+            result = CapacitySearch({**search_config, 'timeouts': timeouts}, server_config).run()
+            result['kem_algorithm'] = server_config.get('kem_algorithm')
+            result['sig_algorithm'] = server_config.get('sig_algorithm')
+            result['cert_chain'] = self.server.cert_chain if self.server else None
+            results.append(result)
+            if on_result:
+                on_result(results)
+
+        if restarted:
+            self.stop_server()
+            self.start_server(base_overrides)
+
+        print("\n" + "=" * 70)
+        print("容量搜尋結果 (knee)")
+        print("=" * 70)
+        for result in results:
+            knee = f"{result['knee_rate']:.2f} conn/s" if result['knee_rate'] is not None else "未達 SLO"
+            size = result.get('handshake_bytes')
+            size_text = f"握手 讀 {size['read']:.0f} B / 寫 {size['written']:.0f} B" if size else "握手大小 N/A"
+            chain = '→'.join(result['cert_chain']) if result.get('cert_chain') else str(result['sig_algorithm'])
+            print(f"  {str(result['kem_algorithm']):<20} {chain:<30} {knee:<16} {size_text}")
+
+        return results
+
+    def run_record_sweep(self, sweep_config):
+        """
+        記錄層參數掃描：對每組記錄層設定重啟 Server，再以各 cipher suite 執行下載模式
+
+        記錄層設定同時套用到 Server 與 Client；量測握手完成後的應用資料吞吐量，
+        以及 Server（程序 CPU，扣除同設定下只下載 1 byte 的握手基準）與
+        Client（s_client 握手後的 CPU）每位元組的 CPU 成本。
+        結束後以原本的設定重啟 Server。
+        """
+        patterns = sweep_config.get('patterns', ['file_download', 'video_streaming'])
+        ciphersuites = sweep_config.get('ciphersuites') or [None]
+        downloads = sweep_config.get('download', {})
+        connections = sweep_config.get('connections', 5)
+        base_overrides = dict(self.server_overrides)
+
+        results = []
+        for record in record_grid(sweep_config.get('record', {})):
+            self.stop_server()
+            self.start_server({
+                **base_overrides,
+                'record': record,
+                'ciphersuites': [c for c in ciphersuites if c] or None,
+            })
+            server_pid = self.server.process.pid if self.server.process else None
+
+            for cipher in ciphersuites:
+                base_override = {
+                    'connections': connections,
+                    'interval': {'min': 0, 'max': 0},
+                    'burst': False,
+                    'record': record,
+                    'ciphersuites': cipher,
+                }
+
+                # 握手基準：相同連線數只下載 1 byte，供扣除每個連線的握手 CPU
+                print(f"\n[RECORD] 握手基準 cipher={cipher or 'default'}  record={record or 'default'}")
+                server_before = process_cpu_seconds(server_pid)
+                baseline = self.generate_pattern(patterns[0], {**base_override, 'download': 1})
+                handshake_cpu = handshake_cpu_per_connection(
+                    baseline, (server_before, process_cpu_seconds(server_pid)))
+
+                for pattern_name in patterns:
+                    print("=" * 70)
+                    print(f"記錄層掃描: {pattern_name}  cipher={cipher or 'default'}  record={record or 'default'}")
+                    print("=" * 70)
+
+                    override = {**base_override, 'download': downloads.get(pattern_name, True)}
+                    server_before = process_cpu_seconds(server_pid)
+                    result = self.generate_pattern(pattern_name, override)
+                    server_cpu = (server_before, process_cpu_seconds(server_pid))
+
+                    results.append({
+                        'pattern': pattern_name,
+                        'ciphersuite': cipher,
+                        'record': record,
+                        **transfer_summary(result, server_cpu, handshake_cpu),
+                    })
+
+        self.stop_server()
+        self.start_server(base_overrides)
+
+        print_sweep_table(results)
+        return {'results': results, 'best': best_by_cipher(results)}
+
+    def start_metrics_server(self):
+        metrics_config = self.patterns.get('metrics', {})
+        if not metrics_config.get('enabled', False):
+            return
+
+        self.metrics_server = MetricsServer(
+            metrics,
+            host=metrics_config.get('host', '127.0.0.1'),
+            port=metrics_config.get('port', 9464)
+        )
+        try:
+            self.metrics_server.start()
+        except OSError as e:
+            print(f"[WARN] Metrics endpoint 啟動失敗: {e}")
+            self.metrics_server = None
+
+    def stop_metrics_server(self):
+        if self.metrics_server:
+            self.metrics_server.stop()
+            self.metrics_server = None
+
+    def save_results(self, run_stem, data):
+        """將實驗結果寫入 JSON 檔案"""
+        results_config = self.patterns.get('results', {})
+        output_dir = Path(results_config.get('output_dir', 'data/results'))
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        output_file = output_dir / f"{run_stem}.json"
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+        print(f"\n結果已儲存: {output_file}")
+        return output_file
+
+    def run_experiment(self, experiment_file, profile=None, resume=False, benchmark=False):
+        """
+        執行實驗
+
+        Args:
+            experiment_file: 實驗配置路徑
+            profile: 啟用 profiling 時的設定 {interval: 秒, tracemalloc: bool}，
+                     輸出寫在 PCAP 同目錄
+            resume: 從上次的檢查點繼續（跳過已完成的步驟，寫入新的 PCAP 分段）
+            benchmark: 以 benchmark 模式執行（實驗配置未設定 benchmark 時使用全域預設值）
+        """
+        self.run_stem = None
+        if profile is None:
+            self._run_experiment(experiment_file, resume, benchmark)
+            return
+
+        profiler.start(
+            interval=profile.get('interval', 0.01),
+            trace_memory=profile.get('tracemalloc', False)
+        )
+        try:
+            self._run_experiment(experiment_file, resume, benchmark)
+        finally:
+            # 任何階段失敗（含讀取配置、載入檢查點、啟動 Server）都停止取樣並寫出 profile
+            profiler.stop()
+            output_dir = self.patterns.get('capture', {}).get('output_dir', 'data/pcaps')
+            run_stem = self.run_stem or f"{Path(experiment_file).stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            profiler.write(output_dir, run_stem)
+
+    def _run_experiment(self, experiment_file, resume, benchmark):
         experiment_path = Path(experiment_file)
         if not experiment_path.exists():
             raise FileNotFoundError(f"找不到實驗配置: {experiment_file}")
 
-        with open(experiment_path, 'r', encoding='utf-8') as f:
-            experiment = yaml.safe_load(f)
+        with profiler.span('yaml'):
+            with open(experiment_path, 'r', encoding='utf-8') as f:
+                experiment = yaml.safe_load(f)
 
         experiment_name = experiment_path.stem
 
+        # 在啟動 Server 與捕獲前檢查並行步驟，避免長時間實驗執行到一半才失敗
+        for seq in experiment.get('sequences', []):
+            if 'parallel' in seq:
+                self.validate_parallel(seq['parallel'])
+
         print("=" * 70)
         print(f"實驗: {experiment.get('name', 'Unknown')}")
         print(f"描述: {experiment.get('description', 'No description')}")
         print("=" * 70)
 
-        self.start_server()
-        self.start_capture(experiment_name)
-
+        checkpoint_config = self.patterns.get('checkpoint', {})
+        checkpoint_path = Path(checkpoint_config.get('dir', 'data/checkpoints')) / f"{experiment_name}.json"
+        checkpointing = resume or experiment.get('checkpoint', checkpoint_config.get('enabled', False))
+
+        if resume:
+            checkpoint = Checkpoint.load(checkpoint_path, experiment_path)
+            checkpoint.restore_rng()
+            run_stem = checkpoint.state['run_stem']
+            record = checkpoint.state['record']
+            self.capture_segments = list(checkpoint.state['capture_segments'])
+            print(f"[RESUME] 從檢查點繼續: 已完成 {checkpoint.state['completed_steps']} 個步驟 "
+                  f"({checkpoint.state['updated_at']})")
+        else:
+            if experiment.get('seed') is not None:
+                random.seed(experiment['seed'])
+            run_stem = f"{experiment_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            record = {
+                'name': experiment.get('name'),
+                'description': experiment.get('description'),
+                'network': experiment.get('network'),
+                'steps': [],
+            }
+            self.capture_segments = []
+            checkpoint = Checkpoint(checkpoint_path, experiment_path, run_stem) if checkpointing else None
+
+        self.run_stem = run_stem
+
+        benchmark = self.benchmark_config(experiment, benchmark)
+        if benchmark:
+            record['benchmark'] = {k: v for k, v in benchmark.items() if k != 'affinity'}
+            record['benchmark']['affinity'] = self.affinity = benchmark.get('affinity', {})
+            print(f"[BENCHMARK] warmup {benchmark.get('warmup', 1)} 次，"
+                  f"重複 {benchmark.get('repeats', 5)} 次")
+            # 在建立任何執行緒與子程序前綁定主執行緒，Client 工作執行緒與 s_client 皆會繼承；
+            # Server 與捕獲執行緒啟動後再各自改綁
+            set_affinity(0, self.affinity.get('client'), 'Client')
+
+        def save_checkpoint(**updates):
+            if checkpoint:
+                checkpoint.save(record=record, capture_segments=self.capture_segments, **updates)
+
+        completed = False
         try:
-            sequences = experiment.get('sequences', [])
-            for seq in sequences:
-                pattern_name = seq['pattern']
-                override = seq.get('override')
+            self.start_metrics_server()
+            self.start_server(experiment.get('server'))
+            if experiment.get('network'):
+                self.start_proxy(experiment['network'])
+            self.start_capture(run_stem, segmented=bool(checkpoint))
+
+            if 'capacity_search' in experiment:
+                def on_search_result(results):
+                    record['capacity_search'] = results
+                    self.rotate_capture()
+                    save_checkpoint(completed_searches=len(results))
+
+                record['capacity_search'] = self.run_capacity_search(
+                    experiment['capacity_search'],
+                    completed=record.get('capacity_search'),
+                    on_result=on_search_result
+                )
+
+            if 'record_sweep' in experiment and 'record_sweep' not in record:
+                record['record_sweep'] = self.run_record_sweep(experiment['record_sweep'])
+                self.rotate_capture()
+                save_checkpoint()
 
-                print(f"\n執行模式: {pattern_name}")
-                if override:
-                    print(f"覆寫參數: {override}")
-
-                result = self.generate_pattern(pattern_name, override)
-                print(f"結果: {result}")
+            sequences = experiment.get('sequences', [])
+            for seq in sequences[len(record['steps']):]:
+                if benchmark:
+                    result = self.run_benchmark_step(seq, benchmark)
+                else:
+                    result = summarize_result(self.run_step(seq))
+                    print(f"結果: {compact_result(result)}")
+                record['steps'].append({
+                    'pattern': seq.get('pattern', 'parallel'),
+                    'result': result,
+                })
+                profiler.snapshot_memory(f"step {len(record['steps'])}: {seq.get('pattern', 'parallel')}")
 
                 wait_time = seq.get('wait', 0)
                 if wait_time > 0:
                     print(f"等待 {wait_time} 秒...")
                     time.sleep(wait_time)
 
+                self.rotate_capture()
+                save_checkpoint(completed_steps=len(record['steps']))
+
+            completed = True
+
         finally:
-            self.stop_capture()
+            self.stop_capture(incomplete=not completed)
+            self.stop_proxy()
             self.stop_server()
+            self.stop_metrics_server()
+
+        record['proxy'] = self.proxy_stats
+        record['metrics'] = metrics.snapshot()
+        if checkpoint:
+            record['capture_segments'] = self.capture_segments
+        self.save_results(run_stem, record)
+
+        if checkpoint:
+            checkpoint.remove()
 
         print("\n" + "=" * 70)
         print("實驗完成!")
@@ -195,16 +805,29 @@ class TrafficGenerator:
 
 
 if __name__ == "__main__":
-    import sys
-
-    if len(sys.argv) < 2:
-        print("\n使用方法:")
-        print("  python traffic_generator.py <experiment_file>")
-        print("\n範例:")
-        print("  python traffic_generator.py configs/experiments/exp_01_benign.yaml")
-        sys.exit(1)
-
-    experiment_file = sys.argv[1]
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="PQC-TLS 流量生成器",
+        epilog="範例: python traffic_generator.py configs/experiments/exp_01_benign.yaml --profile"
+    )
+    parser.add_argument('experiment_file', help="實驗配置檔案")
+    parser.add_argument('--profile', action='store_true',
+                        help="取樣 Python stack 並輸出 collapsed-stack 與階段耗時（寫在 PCAP 同目錄）")
+    parser.add_argument('--profile-interval', type=float, default=10,
+                        help="取樣間隔（毫秒，預設 10）")
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help="搭配 --profile，記錄每個步驟後的記憶體快照")
+    parser.add_argument('--benchmark', action='store_true',
+                        help="benchmark 模式：綁定 CPU、warmup、重複量測並輸出信賴區間")
+    parser.add_argument('--resume', action='store_true',
+                        help="從上次中斷的檢查點繼續（data/checkpoints/實驗名稱.json）")
+    args = parser.parse_args()
+
+    profile = None
+    if args.profile:
+        profile = {'interval': args.profile_interval / 1000, 'tracemalloc': args.tracemalloc}
 
     generator = TrafficGenerator()
-    generator.run_experiment(experiment_file)
+    generator.run_experiment(args.experiment_file, profile=profile, resume=args.resume,
+                             benchmark=args.benchmark)
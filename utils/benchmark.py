@@ -0,0 +1,77 @@
+import os
+from utils.stats import confidence_interval
+
+# 結果中不做統計的欄位（分支明細、逐次結果）
+_SKIPPED_KEYS = {'branches', 'repeats'}
+
+
+def set_affinity(pid, cpus, label):
+    """
+    將程序或執行緒（Linux 上 pid 可為 native thread id）綁定到指定 CPU
+
+    Returns:
+        bool: 是否成功；平台不支援或 CPU 不存在時只印出警告
+    """
+    if not cpus:
+        return False
+    if not hasattr(os, 'sched_setaffinity'):
+        print(f"[WARN] 此平台不支援 os.sched_setaffinity，{label} 未綁定 CPU")
+        return False
+    try:
+        os.sched_setaffinity(pid, set(cpus))
+    except OSError as e:
+        print(f"[WARN] {label} 綁定 CPU {sorted(cpus)} 失敗: {e}")
+        return False
+    print(f"[OK] {label} 綁定 CPU {sorted(cpus)}")
+    return True
+
+
+def flatten_numeric(result, prefix=''):
+    """將巢狀結果展開為 {'latency.p99': 值} 形式，只保留數值欄位"""
+    flat = {}
+    for key, value in result.items():
+        if key in _SKIPPED_KEYS or isinstance(value, bool):
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, (int, float)):
+            flat[name] = value
+        elif isinstance(value, dict):
+            flat.update(flatten_numeric(value, f"{name}."))
+    return flat
+
+
+def aggregate_repeats(results, confidence=0.95, cv_threshold=0.1):
+    """
+    彙整同一步驟重複 K 次的結果
+
+    每個數值欄位計算平均與 t 信賴區間；變異係數超過 cv_threshold 時標記 high_variance。
+
+    Args:
+        results: 各次已摘要的結果（summarize_result 的輸出）
+    """
+    samples = {}
+    for result in results:
+        for name, value in flatten_numeric(result).items():
+            samples.setdefault(name, []).append(value)
+
+    aggregate = {}
+    for name, values in samples.items():
+        stats = confidence_interval(values, confidence)
+        stats['high_variance'] = stats['cv'] is not None and stats['cv'] > cv_threshold
+        aggregate[name] = stats
+    return aggregate
+
+
+def print_aggregate(aggregate, confidence=0.95):
+    """印出彙整表，高變異欄位以 [WARN] 標記"""
+    print(f"\n{'欄位':<28} {'平均':>12} {f'{confidence:.0%} CI':>28} {'CV':>8}")
+    for name, stats in sorted(aggregate.items()):
+        if stats['mean'] is None:
+            continue
+        if stats['ci_low'] is None:
+            interval, cv = '-', '-'
+        else:
+            interval = f"[{stats['ci_low']:.4g}, {stats['ci_high']:.4g}]"
+            cv = f"{stats['cv']:.1%}" if stats['cv'] is not None else '-'
+        flag = '  [WARN] 高變異' if stats['high_variance'] else ''
+        print(f"{name:<28} {stats['mean']:>12.4g} {interval:>28} {cv:>8}{flag}")
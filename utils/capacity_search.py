@@ -0,0 +1,199 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from core.normal_client import TLSClient
+from utils.stats import summarize_latencies
+
+
+class CapacitySearch:
+    """
+    容量搜尋：逐步提高連線速率，找出滿足 SLO 的最高握手速率（knee）
+
+    config 範例:
+        mode: binary              # ramp（逐步遞增）或 binary（二分搜尋）
+        rate: {min: 1, max: 64, step: 2, precision: 1}
+        step_duration: 10         # 每個速率量測秒數
+        min_connections: 20       # 每個速率最少連線數
+        max_workers: 64           # 同時進行的連線上限
+        message_size: 100
+        slo: {min_success_rate: 0.99, max_p99_latency: 1.0, min_offered_ratio: 0.95}
+        timeouts: {connect: 5, handshake: 15, read: 60}
+    """
+
+    def __init__(self, config, server_config):
+        self.config = config
+        self.server_config = server_config
+
+        rate_config = config.get('rate', {})
+        self.rate_min = rate_config.get('min', 1)
+        self.rate_max = rate_config.get('max', 64)
+        self.rate_step = rate_config.get('step', 1)
+        self.precision = rate_config.get('precision', 1)
+
+        self.mode = config.get('mode', 'ramp')
+        self.step_duration = config.get('step_duration', 10)
+        self.min_connections = config.get('min_connections', 20)
+        self.max_workers = config.get('max_workers', 64)
+        self.message = "X" * config.get('message_size', 100)
+
+        slo = config.get('slo', {})
+        self.min_success_rate = slo.get('min_success_rate', 0.99)
+        self.max_p99_latency = slo.get('max_p99_latency', 1.0)
+        # 實際發起速率低於目標速率的此比例時（工作在執行緒池中排隊），該速率視為未通過
+        self.min_offered_ratio = slo.get('min_offered_ratio', 0.95)
+
+        self.client = TLSClient(
+            host=server_config.get('host', 'localhost'),
+            port=server_config.get('port', 4433),
+            kem_algorithm=server_config.get('kem_algorithm'),
+            sig_algorithm=server_config.get('sig_algorithm'),
+            ca_file=server_config.get('ca_file'),
+            timeouts=config.get('timeouts'),
+        )
+        # mTLS 時所有連線共用第一張 Client 憑證
+        client_certs = server_config.get('client_certs')
+        if client_certs:
+            self.client.key_file, self.client.cert_file = client_certs[0]
+
+    def _connect_at(self, scheduled):
+        """
+        執行一個連線，延遲從排定的發起時間起算（包含在執行緒池中排隊的時間）
+
+        Returns:
+            tuple: (connect 結果, 實際開始時間, 自排定時間起算的延遲)
+        """
+        started = time.perf_counter()
+        result = self.client.connect(message=self.message, verbose=False)
+        return result, started, time.perf_counter() - scheduled
+
+    def measure(self, rate):
+        """以固定速率（連線/秒）開放式發起連線，量測成功率與 p99 延遲"""
+        connections = max(self.min_connections, int(rate * self.step_duration))
+        interval = 1.0 / rate
+
+        print(f"\n[CAPACITY] 速率 {rate:.2f} conn/s，共 {connections} 個連線")
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='capacity') as executor:
+            futures = []
+            for i in range(connections):
+                scheduled = start + i * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(self._connect_at, scheduled))
+            outcomes = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+
+        results = [result for result, _, _ in outcomes]
+        latencies = [latency for result, _, latency in outcomes if result['success']]
+        errors = {}
+        for r in results:
+            if not r['success']:
+                errors[r['error']] = errors.get(r['error'], 0) + 1
+        sizes = [r['handshake_bytes'] for r in results if r['handshake_bytes']]
+
+        # 實際發起速率：以各連線真正開始執行的時間計算，工作排隊時會明顯低於目標速率
+        starts = sorted(started for _, started, _ in outcomes)
+        achieved_rate = connections / (starts[-1] - starts[0] + interval)
+
+        success_rate = len(latencies) / connections
+        summary = summarize_latencies(latencies)
+        passed = (
+            success_rate >= self.min_success_rate
+            and summary['p99'] is not None
+            and summary['p99'] <= self.max_p99_latency
+            and achieved_rate >= rate * self.min_offered_ratio
+        )
+
+        p99_text = f"{summary['p99']:.3f}s" if summary['p99'] is not None else "N/A"
+        print(f"  成功率: {success_rate:.2%}  p99: {p99_text}  實際發起: {achieved_rate:.2f} conn/s  "
+              f"{'[OK] 符合 SLO' if passed else '[FAIL] 超出 SLO'}")
+
+        return {
+            'offered_rate': rate,
+            'achieved_rate': achieved_rate,
+            'connections': connections,
+            'success_rate': success_rate,
+            'throughput': len(latencies) / elapsed,
+            'latency': summary,
+            'errors': errors,
+            'handshake_bytes': self._mean_handshake_bytes(sizes),
+            'handshake_samples': len(sizes),
+            'passed': passed,
+        }
+
+    @staticmethod
+    def _mean_handshake_bytes(sizes):
+        """每個連線的平均握手讀寫位元組，沒有樣本時為 None"""
+        if not sizes:
+            return None
+        return {
+            'read': sum(size['read'] for size in sizes) / len(sizes),
+            'written': sum(size['written'] for size in sizes) / len(sizes),
+        }
+
+    def run(self):
+        """執行搜尋，回傳 knee（最高可持續速率）與所有量測點"""
+        if self.mode == 'binary':
+            steps = self._binary_search()
+        else:
+            steps = self._ramp()
+
+        passing = [step for step in steps if step['passed']]
+        knee = max(passing, key=lambda step: step['offered_rate']) if passing else None
+
+        # 握手大小與速率無關，以所有量測點的連線數加權平均
+        samples = sum(step['handshake_samples'] for step in steps)
+        handshake_bytes = None
+        if samples:
+            handshake_bytes = {
+                direction: sum(step['handshake_bytes'][direction] * step['handshake_samples']
+                               for step in steps if step['handshake_samples']) / samples
+                for direction in ('read', 'written')
+            }
+
+        return {
+            'mode': self.mode,
+            'slo': {
+                'min_success_rate': self.min_success_rate,
+                'max_p99_latency': self.max_p99_latency,
+                'min_offered_ratio': self.min_offered_ratio,
+            },
+            'knee_rate': knee['offered_rate'] if knee else None,
+            'knee_throughput': knee['throughput'] if knee else None,
+            'knee_p99_latency': knee['latency']['p99'] if knee else None,
+            'handshake_bytes': handshake_bytes,
+            'steps': sorted(steps, key=lambda step: step['offered_rate']),
+        }
+
+    def _ramp(self):
+        steps = []
+        rate = self.rate_min
+        while rate <= self.rate_max:
+            step = self.measure(rate)
+            steps.append(step)
+            if not step['passed']:
+                break
+            rate += self.rate_step
+        return steps
+
+    def _binary_search(self):
+        steps = [self.measure(self.rate_min)]
+        if not steps[0]['passed']:
+            return steps
+
+        high_step = self.measure(self.rate_max)
+        steps.append(high_step)
+        if high_step['passed']:
+            return steps
+
+        low, high = self.rate_min, self.rate_max
+        while high - low > self.precision:
+            mid = (low + high) / 2
+            step = self.measure(mid)
+            steps.append(step)
+            if step['passed']:
+                low = mid
+            else:
+                high = mid
+        return steps
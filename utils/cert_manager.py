@@ -1,5 +1,7 @@
 import os
+import secrets
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from utils.settings import settings
 from utils.openssl_cnf import get_minimal_openssl_cnf
 
@@ -8,16 +10,16 @@ class CertManager:
         self.cert_dir = cert_dir or settings.cert['out_dir']
         os.makedirs(self.cert_dir, exist_ok=True)
         
-    def generate_server_cert(self, algorithm=None, days=None):
-        """生成 Server 憑證和私鑰"""
+    def generate_server_cert(self, algorithm=None, days=None, name='server'):
+        """生成 Server 憑證和私鑰（檔名為 {name}_key.pem / {name}_cert.pem）"""
 
         algorithm = algorithm or settings.algorithms['default_signature']
         days = days or settings.openssl['days']
 
         algorithm = settings.get_algorithm(algorithm)
         
-        key_file = os.path.join(self.cert_dir, 'server_key.pem')
-        cert_file = os.path.join(self.cert_dir, 'server_cert.pem')
+        key_file = os.path.join(self.cert_dir, f'{name}_key.pem')
+        cert_file = os.path.join(self.cert_dir, f'{name}_cert.pem')
         
         openssl = settings.get_openssl_cmd()
         provider_path = settings.paths['oqs_provider_dir']
@@ -60,6 +62,204 @@ class CertManager:
         
         return key_file, cert_file
     
+    def build_chain(self, algorithms, days=None):
+        """
+        產生並快取 root → intermediate → leaf 憑證鏈
+
+        Args:
+            algorithms: 由 root 到 leaf 的簽章算法列表，長度即鏈深度，
+                        例如 ['mldsa87', 'mldsa65', 'mldsa65']
+            days: 有效天數
+
+        Returns:
+            dict: key_file / cert_file（leaf）、chain_file（中繼憑證，無則 None）、
+                  ca_file（root）、algorithms
+        """
+        days = days or settings.openssl['days']
+        chain_dir = os.path.join(self.cert_dir, 'chains', '_'.join(algorithms))
+        os.makedirs(chain_dir, exist_ok=True)
+
+        depth = len(algorithms)
+        key_files = [os.path.join(chain_dir, f'level{i}_key.pem') for i in range(depth)]
+        cert_files = [os.path.join(chain_dir, f'level{i}_cert.pem') for i in range(depth)]
+        chain_file = os.path.join(chain_dir, 'chain.pem') if depth > 2 else None
+
+        chain = {
+            'key_file': key_files[-1],
+            'cert_file': cert_files[-1],
+            'chain_file': chain_file,
+            'ca_file': cert_files[0],
+            'algorithms': list(algorithms),
+        }
+
+        if all(os.path.exists(f) for f in key_files + cert_files):
+            print(f"[OK] 使用快取憑證鏈: {' → '.join(algorithms)}")
+            return chain
+
+        print(f"生成憑證鏈: {' → '.join(algorithms)}")
+
+        # 各層私鑰互相獨立，平行生成
+        with ThreadPoolExecutor(max_workers=depth) as executor:
+            list(executor.map(self._generate_key, algorithms, key_files))
+
+        cfg_path = get_minimal_openssl_cnf()
+        for level in range(depth):
+            is_leaf = level == depth - 1
+            if level == 0:
+                subject = settings.openssl['subject'] if is_leaf else '/CN=PQC Root CA'
+                self._run([
+                    'req', '-new', '-x509',
+                    '-key', key_files[0],
+                    '-out', cert_files[0],
+                    '-days', str(days),
+                    '-subj', subject,
+                    '-config', cfg_path,
+                    '-extensions', 'v3_req' if is_leaf else 'v3_ca',
+                ], "Root 憑證生成失敗")
+                continue
+
+            subject = settings.openssl['subject'] if is_leaf else f'/CN=PQC Intermediate CA {level}'
+            self._sign_certificate(
+                key_files[level], cert_files[level], subject,
+                cert_files[level - 1], key_files[level - 1], days,
+                'v3_req' if is_leaf else 'v3_ca'
+            )
+
+        if chain_file:
+            with open(chain_file, 'w', encoding='utf-8') as out:
+                for cert_file in reversed(cert_files[1:-1]):
+                    with open(cert_file, 'r', encoding='utf-8') as f:
+                        out.write(f.read())
+
+        print(f"✅ 憑證鏈已生成: {chain_dir}")
+        return chain
+
+    def build_client_ca(self, algorithm, days=None):
+        """
+        產生並快取簽發 Client 憑證用的自簽 CA（certs/clients/ca_<算法>/）
+
+        Returns:
+            tuple: (key_file, cert_file, created)，created 表示本次新產生
+        """
+        days = days or settings.openssl['days']
+        ca_dir = os.path.join(self.cert_dir, 'clients', f'ca_{algorithm}')
+        os.makedirs(ca_dir, exist_ok=True)
+        key_file = os.path.join(ca_dir, 'ca_key.pem')
+        cert_file = os.path.join(ca_dir, 'ca_cert.pem')
+
+        if os.path.exists(key_file) and os.path.exists(cert_file):
+            return key_file, cert_file, False
+
+        print(f"生成 Client CA: {algorithm}")
+        self._generate_key(algorithm, key_file)
+        self._run([
+            'req', '-new', '-x509',
+            '-key', key_file,
+            '-out', cert_file,
+            '-days', str(days),
+            '-subj', '/CN=PQC Client CA',
+            '-config', get_minimal_openssl_cnf(),
+            '-extensions', 'v3_ca',
+        ], "Client CA 生成失敗")
+        return key_file, cert_file, True
+
+    def issue_client_certs(self, algorithm, count, ca_algorithm=None, days=None, max_workers=8):
+        """
+        批次簽發並快取 Client 憑證（mTLS）
+
+        憑證放在 certs/clients/ca_<CA 算法>/<算法>/client<編號>_key/cert.pem，
+        只產生缺少的部分；CA 重新產生時全部重簽。各張憑證互相獨立，平行產生。
+
+        Args:
+            algorithm: Client 憑證的簽章算法
+            count: 憑證數量
+            ca_algorithm: Client CA 的簽章算法（預設同 algorithm）
+
+        Returns:
+            dict: ca_file（Server 驗證用）、clients（[(key_file, cert_file), ...]）
+        """
+        days = days or settings.openssl['days']
+        ca_key, ca_cert, ca_created = self.build_client_ca(ca_algorithm or algorithm, days)
+
+        client_dir = os.path.join(os.path.dirname(ca_cert), algorithm)
+        os.makedirs(client_dir, exist_ok=True)
+        clients = [
+            (os.path.join(client_dir, f'client{i:03d}_key.pem'),
+             os.path.join(client_dir, f'client{i:03d}_cert.pem'))
+            for i in range(count)
+        ]
+
+        missing = [
+            (i, key_file, cert_file) for i, (key_file, cert_file) in enumerate(clients)
+            if ca_created or not (os.path.exists(key_file) and os.path.exists(cert_file))
+        ]
+
+        if missing:
+            print(f"簽發 {len(missing)} 張 {algorithm} Client 憑證...")
+
+            def issue(entry):
+                i, key_file, cert_file = entry
+                self._generate_key(algorithm, key_file)
+                self._sign_certificate(
+                    key_file, cert_file, f'/CN=PQC Client {i:03d}',
+                    ca_cert, ca_key, days, 'v3_client'
+                )
+
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+                list(executor.map(issue, missing))
+            print(f"✅ Client 憑證已生成: {client_dir}")
+        else:
+            print(f"[OK] 使用快取 Client 憑證: {count} 張 {algorithm}")
+
+        return {'ca_file': ca_cert, 'clients': clients}
+
+    def _sign_certificate(self, key_file, cert_file, subject, ca_cert, ca_key, days, extensions):
+        """以 CA 簽發憑證（CSR 暫存於憑證旁，完成後刪除）"""
+        cfg_path = get_minimal_openssl_cnf()
+        csr_file = f'{cert_file}.csr'
+        self._run([
+            'req', '-new',
+            '-key', key_file,
+            '-out', csr_file,
+            '-subj', subject,
+            '-config', cfg_path,
+        ], "CSR 生成失敗")
+        self._run([
+            'x509', '-req',
+            '-in', csr_file,
+            '-CA', ca_cert,
+            '-CAkey', ca_key,
+            '-set_serial', str(secrets.randbits(63)),
+            '-out', cert_file,
+            '-days', str(days),
+            '-extfile', cfg_path,
+            '-extensions', extensions,
+        ], "憑證簽發失敗")
+        os.remove(csr_file)
+
+    def _generate_key(self, algorithm, key_file):
+        self._run([
+            'genpkey',
+            '-algorithm', settings.get_algorithm(algorithm),
+            '-out', key_file,
+        ], "私鑰生成失敗")
+
+    def _run(self, args, error_message):
+        """執行 openssl 子指令（自動加上 provider 參數）"""
+        openssl = settings.get_openssl_cmd()
+        provider_path = settings.paths['oqs_provider_dir']
+        result = subprocess.run([
+            openssl, *args,
+            '-provider-path', provider_path,
+            '-provider', 'oqsprovider',
+            '-provider', 'default',
+        ], capture_output=True, text=True)
+
+        if result.returncode != 0:
+            print(f"❌ 錯誤: {result.stderr}")
+            raise RuntimeError(error_message)
+        return result
+
     def verify_cert(self, cert_file):
         openssl = settings.get_openssl_cmd()
         provider_path = settings.paths['oqs_provider_dir']
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+import random
+from datetime import datetime
+
+
+class Checkpoint:
+    """
+    實驗進度檢查點（JSON）
+
+    每完成一個序列步驟（或一組容量搜尋設定）就寫入一次：
+    已完成步驟數、部分結果、亂數狀態與已關閉的 PCAP 分段。
+    寫入時先寫暫存檔再 os.replace，避免中途當機留下損毀的檔案。
+    """
+
+    def __init__(self, path, experiment_file, run_stem):
+        self.path = path
+        self.state = {
+            'experiment_file': str(experiment_file),
+            'experiment_hash': self.hash_file(experiment_file),
+            'run_stem': run_stem,
+            'completed_steps': 0,
+            'completed_searches': 0,
+            'record': None,
+            'capture_segments': [],
+            'rng_state': None,
+            'updated_at': None,
+        }
+
+    @staticmethod
+    def hash_file(path):
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    @classmethod
+    def load(cls, path, experiment_file):
+        """
+        讀取檢查點，並確認實驗配置在中斷後沒有被修改
+
+        Raises:
+            FileNotFoundError: 檢查點不存在
+            ValueError: 實驗配置與檢查點不一致
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"找不到檢查點: {path}")
+
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+
+        if state['experiment_hash'] != cls.hash_file(experiment_file):
+            raise ValueError(f"實驗配置已變更，無法從檢查點繼續: {experiment_file}")
+
+        checkpoint = cls.__new__(cls)
+        checkpoint.path = path
+        checkpoint.state = state
+        return checkpoint
+
+    def save(self, **updates):
+        self.state.update(updates)
+        self.state['rng_state'] = self._dump_rng()
+        self.state['updated_at'] = datetime.now().isoformat(timespec='seconds')
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def restore_rng(self):
+        rng_state = self.state.get('rng_state')
+        if rng_state:
+            version, internal, gauss_next = rng_state
+            random.setstate((version, tuple(internal), gauss_next))
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @staticmethod
+    def _dump_rng():
+        version, internal, gauss_next = random.getstate()
+        return [version, list(internal), gauss_next]
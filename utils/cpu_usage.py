@@ -0,0 +1,21 @@
+import os
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def process_cpu_seconds(pid):
+    """取得程序累計 CPU 時間（psutil 或 /proc，皆不可用時回傳 None）"""
+    if not pid:
+        return None
+    try:
+        if psutil:
+            times = psutil.Process(pid).cpu_times()
+            return times.user + times.system
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except Exception:
+        return None
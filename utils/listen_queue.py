@@ -0,0 +1,35 @@
+import os
+
+_PROC_FILES = ('/proc/net/tcp', '/proc/net/tcp6')
+_TCP_LISTEN = '0A'
+
+
+def listen_queue(port):
+    """
+    讀取監聽 socket 目前等待 accept 的連線數（Linux /proc/net/tcp）
+
+    LISTEN 狀態的 socket 在 /proc/net/tcp 中的 rx_queue 即 accept queue 長度（同 ss -lnt 的 Recv-Q）。
+
+    Returns:
+        int: 等待 accept 的連線數，同一埠有多個監聽 socket（IPv4 / IPv6）時相加；
+             平台不支援或找不到監聽 socket 時回傳 None
+    """
+    queued = 0
+    found = False
+    for path in _PROC_FILES:
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, 'r') as f:
+                next(f, None)
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 5 or fields[3] != _TCP_LISTEN:
+                        continue
+                    if int(fields[1].rsplit(':', 1)[1], 16) != port:
+                        continue
+                    queued += int(fields[4].split(':')[1], 16)
+                    found = True
+        except (OSError, ValueError, IndexError):
+            continue
+    return queued if found else None
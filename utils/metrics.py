@@ -0,0 +1,259 @@
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 握手延遲的固定 bucket 上界（秒）
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _ShardedCells:
+    """
+    每個執行緒各自持有一組計數格，寫入時不需加鎖
+
+    只有擁有者執行緒會寫入自己的格子，讀取時再加總所有格子，
+    因此熱路徑上只有一次 thread-local 查詢與一次整數加法。
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._local = threading.local()
+        self._cells = []
+
+    def cell(self):
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = [0] * self._size
+            self._local.cell = cell
+            self._cells.append(cell)
+            return cell
+
+    def totals(self):
+        totals = [0] * self._size
+        for cell in list(self._cells):
+            for i, value in enumerate(cell):
+                totals[i] += value
+        return totals
+
+
+class _CounterValue:
+    def __init__(self):
+        self._shards = _ShardedCells(1)
+
+    def inc(self, amount=1):
+        self._shards.cell()[0] += amount
+
+    def get(self):
+        return self._shards.totals()[0]
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # 每個 bucket 一格，外加 +Inf、總和、樣本數
+        self._shards = _ShardedCells(len(buckets) + 3)
+
+    def observe(self, value):
+        cell = self._shards.cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def get(self):
+        totals = self._shards.totals()
+        return {
+            'buckets': totals[:len(self.buckets) + 1],
+            'sum': totals[-2],
+            'count': totals[-1],
+        }
+
+
+class _Metric:
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = self._new_value()
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children.setdefault(key, self._new_value())
+        return child
+
+    def collect(self):
+        return [
+            (dict(zip(self.labelnames, key)), child.get())
+            for key, child in list(self._children.items())
+        ]
+
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def _new_value(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+
+class Histogram(_Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_value(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._children[()].observe(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{k}="{v}"' for k, v in labels.items())
+    return '{' + pairs + '}'
+
+
+class MetricsRegistry:
+    """指標註冊表：以 Prometheus 文字格式輸出，並可快照寫入結果檔"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, documentation, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames=labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames=labelnames, buckets=buckets)
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            for labels, value in metric.collect():
+                if metric.metric_type == 'counter':
+                    lines.append(f"{metric.name}{_format_labels(labels)} {value}")
+                    continue
+
+                cumulative = 0
+                bounds = [str(b) for b in metric.buckets] + ['+Inf']
+                for bound, count in zip(bounds, value['buckets']):
+                    cumulative += count
+                    lines.append(f"{metric.name}_bucket{_format_labels({**labels, 'le': bound})} {cumulative}")
+                lines.append(f"{metric.name}_sum{_format_labels(labels)} {value['sum']}")
+                lines.append(f"{metric.name}_count{_format_labels(labels)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """回傳所有指標目前數值（可序列化為 JSON）"""
+        snapshot = {}
+        for metric in list(self._metrics.values()):
+            entry = {'type': metric.metric_type, 'values': []}
+            if metric.metric_type == 'histogram':
+                entry['buckets'] = list(metric.buckets)
+            for labels, value in metric.collect():
+                entry['values'].append({'labels': labels, 'value': value})
+            snapshot[metric.name] = entry
+        return snapshot
+
+
+class MetricsServer:
+    """在本機 HTTP 埠提供 /metrics（Prometheus 格式）"""
+
+    def __init__(self, registry, host='127.0.0.1', port=9464):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.httpd = None
+        self.thread = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"[OK] Metrics endpoint: http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+
+# 單例
+metrics = MetricsRegistry()
+
+CONNECTIONS_STARTED = metrics.counter(
+    'pqctls_connections_started_total', 'TLS connections started')
+CONNECTIONS_SUCCEEDED = metrics.counter(
+    'pqctls_connections_succeeded_total', 'TLS connections with a completed handshake')
+CONNECTIONS_FAILED = metrics.counter(
+    'pqctls_connections_failed_total', 'TLS connections that failed, by error class', labelnames=('error',))
+HANDSHAKE_LATENCY = metrics.histogram(
+    'pqctls_handshake_duration_seconds', 'Time from TCP connect to handshake completion in seconds, by auth mode',
+    labelnames=('auth',))
+CONNECTION_DURATION = metrics.histogram(
+    'pqctls_connection_duration_seconds',
+    'Client-observed s_client lifetime (spawn, handshake and response) in seconds, by auth mode',
+    labelnames=('auth',))
+APP_BYTES_SENT = metrics.counter(
+    'pqctls_app_bytes_sent_total', 'Application bytes sent by clients')
+HANDSHAKE_BYTES_READ = metrics.counter(
+    'pqctls_handshake_bytes_read_total', 'Handshake bytes read by clients, by auth mode', labelnames=('auth',))
+HANDSHAKE_BYTES_WRITTEN = metrics.counter(
+    'pqctls_handshake_bytes_written_total', 'Handshake bytes written by clients, by auth mode', labelnames=('auth',))
+CLIENT_CERT_BYTES = metrics.counter(
+    'pqctls_client_cert_bytes_total', 'DER bytes of client certificates sent in completed mTLS handshakes')
+CAPTURED_PACKETS = metrics.counter(
+    'pqctls_captured_packets_total', 'Packets captured by TrafficCapture')
+CAPTURED_BYTES = metrics.counter(
+    'pqctls_captured_bytes_total', 'Bytes captured by TrafficCapture')
+CAPTURE_DROPS = metrics.counter(
+    'pqctls_capture_dropped_packets_total',
+    'Packets dropped by the capture socket (AF_PACKET or pcap statistics, where the platform reports them)')
+CAPTURE_CALLBACK_ERRORS = metrics.counter(
+    'pqctls_capture_callback_errors_total', 'Captured packets whose summary could not be printed by the callback')
+FLOOD_HANDSHAKES = metrics.counter(
+    'pqctls_flood_handshakes_total', 'Template ClientHello handshakes by outcome', labelnames=('outcome',))
+FLOOD_RESPONSE_LATENCY = metrics.histogram(
+    'pqctls_flood_response_seconds', 'Time from ClientHello sent to first server record')
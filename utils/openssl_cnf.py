@@ -54,6 +54,16 @@ def get_minimal_openssl_cnf() -> str:
         "basicConstraints = CA:FALSE",
         "keyUsage         = digitalSignature, keyEncipherment",
         "extendedKeyUsage = serverAuth",
+        "",
+        "[v3_ca]",
+        "basicConstraints     = critical, CA:TRUE",
+        "keyUsage             = critical, keyCertSign, cRLSign",
+        "subjectKeyIdentifier = hash",
+        "",
+        "[v3_client]",
+        "basicConstraints = CA:FALSE",
+        "keyUsage         = digitalSignature",
+        "extendedKeyUsage = clientAuth",
     ])
     
     content = "\n".join(lines) + "\n"
@@ -0,0 +1,161 @@
+import contextlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Profiler:
+    """
+    低開銷的取樣式 profiler
+
+    - 背景執行緒定期讀取所有 Python 執行緒的 stack（sys._current_frames），
+      輸出 collapsed-stack 格式，可直接交給 flamegraph.pl / speedscope
+    - span() 記錄各階段（spawn / handshake / parse / sleep）的 wall-clock 時間
+    - 可選的 tracemalloc 快照，觀察記憶體成長
+
+    未啟用時 span() 只回傳共用的 nullcontext，熱路徑幾乎沒有成本。
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.interval = 0.01
+        self.stacks = Counter()
+        self.samples = 0
+        self.spans = {}
+        self.memory_snapshots = []
+
+        self._spans_lock = threading.Lock()
+        self._sampler = None
+        self._stop_event = threading.Event()
+        self._trace_memory = False
+
+    def start(self, interval=0.01, trace_memory=False):
+        """
+        開始取樣
+
+        Args:
+            interval: 取樣間隔（秒）
+            trace_memory: 是否啟用 tracemalloc
+        """
+        self.enabled = True
+        self.interval = interval
+        self._trace_memory = trace_memory
+        self._stop_event.clear()
+
+        if trace_memory:
+            tracemalloc.start(25)
+            self.snapshot_memory('start')
+
+        self._sampler = threading.Thread(target=self._sample_loop, name='profiler', daemon=True)
+        self._sampler.start()
+        print(f"[PROFILE] 取樣已啟動 (間隔 {interval * 1000:.0f} ms"
+              f"{', tracemalloc' if trace_memory else ''})")
+
+    def stop(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._stop_event.set()
+        if self._sampler:
+            self._sampler.join()
+            self._sampler = None
+
+        if self._trace_memory:
+            self.snapshot_memory('end')
+            tracemalloc.stop()
+
+    def span(self, name):
+        """記錄一個階段的 wall-clock 時間（with profiler.span('spawn'): ...）"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._timed(name)
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._spans_lock:
+                span = self.spans.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+                span['count'] += 1
+                span['total'] += elapsed
+                span['max'] = max(span['max'], elapsed)
+
+    def snapshot_memory(self, label):
+        """記錄 tracemalloc 快照（未啟用 tracemalloc 時忽略）"""
+        if tracemalloc.is_tracing():
+            self.memory_snapshots.append((label, tracemalloc.take_snapshot()))
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                    frame = frame.f_back
+                # 同一執行緒池的 worker 合併成一個根節點
+                thread_name = re.sub(r'[-_]\d+$', '', names.get(thread_id, 'unknown'))
+                stack.append(thread_name)
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write(self, output_dir, stem):
+        """
+        輸出 profile 結果
+
+        Returns:
+            list: 已寫入的檔案路徑
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        written = []
+
+        collapsed_file = os.path.join(output_dir, f"{stem}.collapsed.txt")
+        with open(collapsed_file, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        written.append(collapsed_file)
+
+        spans_file = os.path.join(output_dir, f"{stem}.spans.json")
+        with self._spans_lock:
+            spans = {
+                name: {**span, 'mean': span['total'] / span['count']}
+                for name, span in self.spans.items()
+            }
+        with open(spans_file, 'w', encoding='utf-8') as f:
+            json.dump({'samples': self.samples, 'interval': self.interval, 'spans': spans},
+                      f, ensure_ascii=False, indent=2)
+        written.append(spans_file)
+
+        if len(self.memory_snapshots) > 1:
+            memory_file = os.path.join(output_dir, f"{stem}.tracemalloc.txt")
+            base_label, base = self.memory_snapshots[0]
+            with open(memory_file, 'w', encoding='utf-8') as f:
+                for label, snapshot in self.memory_snapshots[1:]:
+                    f.write(f"=== {label} (相對於 {base_label}) ===\n")
+                    for stat in snapshot.compare_to(base, 'lineno')[:15]:
+                        f.write(f"{stat}\n")
+                    f.write("\n")
+            written.append(memory_file)
+
+        print(f"\n[PROFILE] 取樣 {self.samples} 次，輸出:")
+        for path in written:
+            print(f"   {path}")
+        return written
+
+
+# 單例
+profiler = Profiler()
@@ -0,0 +1,104 @@
+import itertools
+from utils.tls_options import RECORD_OPTIONS
+
+
+def record_grid(grid):
+    """
+    展開記錄層參數網格
+
+    Args:
+        grid: 例如 {max_send_frag: [1024, 4096, 16384], read_buf: 65536}（單一值視為只有一個選項）
+
+    Returns:
+        list: 所有組合的 record 設定；grid 為空時回傳 [{}]（OpenSSL 預設）
+    """
+    unknown = set(grid) - set(RECORD_OPTIONS)
+    if unknown:
+        raise ValueError(f"不支援的記錄層參數: {', '.join(sorted(unknown))}")
+    names = [name for name in RECORD_OPTIONS if name in grid]
+    values = [grid[name] if isinstance(grid[name], list) else [grid[name]] for name in names]
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+
+def _delta(before, after):
+    if before is None or after is None:
+        return None
+    return after - before
+
+
+def handshake_cpu_per_connection(result, server_cpu):
+    """
+    握手基準（只下載 1 byte）每個連線的 Server CPU 秒數，無法取得時為 None
+
+    Args:
+        result: 基準執行的 SimpleTraffic 結果
+        server_cpu: (before, after) Server CPU 秒數
+    """
+    seconds = _delta(*server_cpu)
+    connections = result.get('success', 0) + result.get('failed', 0)
+    if seconds is None or not connections:
+        return None
+    return seconds / connections
+
+
+def transfer_summary(result, server_cpu, handshake_cpu=None):
+    """
+    下載結果的吞吐量與每位元組 CPU 成本
+
+    吞吐量與 Client CPU 只計握手完成到連線關閉的區間（SimpleTraffic 的 transfer_time /
+    client_cpu_seconds）；Server CPU 扣除握手基準後再除以位元組數。
+
+    Args:
+        result: 下載模式 SimpleTraffic 的結果
+        server_cpu: (before, after) Server CPU 秒數，無法取得時為 None
+        handshake_cpu: 每個連線的握手 Server CPU 秒數（handshake_cpu_per_connection），
+                       None 時不扣除
+    """
+    bytes_received = result.get('bytes_received', 0)
+    transfer_time = result.get('transfer_time', 0)
+    server_seconds = _delta(*server_cpu)
+    if server_seconds is not None and handshake_cpu is not None:
+        connections = result.get('success', 0) + result.get('failed', 0)
+        server_seconds = max(server_seconds - handshake_cpu * connections, 0.0)
+    client_seconds = result.get('client_cpu_seconds')
+
+    return {
+        'success': result.get('success', 0),
+        'failed': result.get('failed', 0),
+        'bytes_received': bytes_received,
+        'throughput_mbps': bytes_received * 8 / transfer_time / 1e6 if transfer_time > 0 else None,
+        'server_cpu_ns_per_byte': server_seconds * 1e9 / bytes_received
+        if server_seconds is not None and bytes_received else None,
+        'client_cpu_ns_per_byte': client_seconds * 1e9 / bytes_received
+        if client_seconds is not None and bytes_received else None,
+        'ciphers': result.get('ciphers', {}),
+    }
+
+
+def best_by_cipher(results):
+    """每個 (模式, cipher suite) 吞吐量最高的記錄層設定"""
+    best = {}
+    for entry in results:
+        if entry['throughput_mbps'] is None:
+            continue
+        key = f"{entry['pattern']}/{entry['ciphersuite'] or 'default'}"
+        if key not in best or entry['throughput_mbps'] > best[key]['throughput_mbps']:
+            best[key] = {
+                'record': entry['record'],
+                'throughput_mbps': entry['throughput_mbps'],
+                'server_cpu_ns_per_byte': entry['server_cpu_ns_per_byte'],
+            }
+    return best
+
+
+def print_sweep_table(results):
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else 'N/A'
+
+    print(f"\n{'模式':<16} {'Cipher suite':<30} {'記錄層設定':<40} {'Mbit/s':>10} {'Server ns/B':>12} {'Client ns/B':>12}")
+    for entry in results:
+        record = ', '.join(f"{k}={v}" for k, v in entry['record'].items()) or 'default'
+        print(f"{entry['pattern']:<16} {str(entry['ciphersuite'] or 'default'):<30} {record:<40} "
+              f"{fmt(entry['throughput_mbps'], '.2f'):>10} "
+              f"{fmt(entry['server_cpu_ns_per_byte'], '.2f'):>12} "
+              f"{fmt(entry['client_cpu_ns_per_byte'], '.2f'):>12}")
@@ -66,6 +66,12 @@ class Settings:
     def get_algorithm(self, name):
         alias_map = self.algorithms.get('alias_map', {})
         return alias_map.get(name, name)
+
+    def get_algorithm_list(self, names):
+        """將單一算法或算法列表轉為 OpenSSL 的冒號分隔格式"""
+        if isinstance(names, str):
+            names = [names]
+        return ':'.join(self.get_algorithm(name) for name in names)
     
     def get_openssl_cmd(self):
         return self.paths['openssl_exe']
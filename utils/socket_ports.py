@@ -0,0 +1,54 @@
+import os
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+_PROC_FILES = ('/proc/net/tcp', '/proc/net/tcp6')
+
+
+def local_port(pid, remote_port):
+    """
+    取得程序連到 remote_port 的 TCP 連線的本機埠（psutil 或 Linux /proc）
+
+    用於以 (Client 埠, Server 埠) 對應 PCAP 中的 flow。
+
+    Returns:
+        int: 本機埠；程序已結束、找不到連線或平台不支援時回傳 None
+    """
+    if not pid:
+        return None
+    try:
+        if psutil:
+            process = psutil.Process(pid)
+            connections = getattr(process, 'net_connections', process.connections)(kind='tcp')
+            for conn in connections:
+                if conn.raddr and conn.raddr.port == remote_port:
+                    return conn.laddr.port
+            return None
+        return _proc_local_port(pid, remote_port)
+    except Exception:
+        return None
+
+
+def _proc_local_port(pid, remote_port):
+    fd_dir = f'/proc/{pid}/fd'
+    inodes = set()
+    for fd in os.listdir(fd_dir):
+        target = os.readlink(os.path.join(fd_dir, fd))
+        if target.startswith('socket:['):
+            inodes.add(target[8:-1])
+
+    for path in _PROC_FILES:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r') as f:
+            next(f, None)
+            for line in f:
+                fields = line.split()
+                if len(fields) < 10 or fields[9] not in inodes:
+                    continue
+                if int(fields[2].rsplit(':', 1)[1], 16) == remote_port:
+                    return int(fields[1].rsplit(':', 1)[1], 16)
+    return None
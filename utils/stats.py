@@ -0,0 +1,112 @@
+import math
+
+
+def percentile(values, q):
+    """
+    以 nearest-rank 方法計算百分位數
+
+    Args:
+        values: 數值列表
+        q: 百分位（0-100）
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize_latencies(latencies):
+    """回傳延遲摘要（秒）：平均、p50、p99、最大值"""
+    if not latencies:
+        return {'mean': None, 'p50': None, 'p99': None, 'max': None}
+    return {
+        'mean': sum(latencies) / len(latencies),
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies),
+    }
+
+
+def summarize_flood(windows):
+    """
+    彙整 handshake_flood 的量測視窗（parallel 合併後可能有多個，皆針對同一個 Server）
+
+    Args:
+        windows: [{start, end, handshakes, client_hello_bytes, server_cpu: [before, after] | None,
+                   listen_queue: [樣本]}]，start / end 為 epoch 秒
+
+    Returns:
+        dict: achieved_rate（握手/秒）、server_cpu_seconds、server_cpu_utilization、
+              server_cpu_ms_per_handshake、listen_queue {max, mean, samples}、client_hello_bytes
+    """
+    start = min(window['start'] for window in windows)
+    end = max(window['end'] for window in windows)
+    elapsed = end - start
+    handshakes = sum(window['handshakes'] for window in windows)
+
+    # Server CPU 為同一程序的累計值：取最早開始與最晚結束的樣本，避免重疊視窗重複計算
+    cpu_seconds = None
+    if all(window['server_cpu'] for window in windows):
+        first = min(windows, key=lambda window: window['start'])
+        last = max(windows, key=lambda window: window['end'])
+        cpu_seconds = last['server_cpu'][1] - first['server_cpu'][0]
+
+    queue = [sample for window in windows for sample in window['listen_queue']]
+    return {
+        'achieved_rate': handshakes / elapsed if elapsed > 0 else 0,
+        'server_cpu_seconds': cpu_seconds,
+        'server_cpu_utilization': cpu_seconds / elapsed if cpu_seconds is not None and elapsed > 0 else None,
+        'server_cpu_ms_per_handshake': cpu_seconds * 1000 / handshakes
+        if cpu_seconds is not None and handshakes else None,
+        'listen_queue': {'max': max(queue), 'mean': sum(queue) / len(queue), 'samples': len(queue)}
+        if queue else None,
+        'client_hello_bytes': sorted({window['client_hello_bytes'] for window in windows}),
+    }
+
+
+# 雙尾 t 分布臨界值 {信賴水準: {自由度: t}}；表中沒有的自由度取較小的一格（保守）
+_T_TABLE = {
+    0.90: {1: 6.314, 2: 2.920, 3: 2.353, 4: 2.132, 5: 2.015, 6: 1.943, 7: 1.895, 8: 1.860,
+           9: 1.833, 10: 1.812, 12: 1.782, 15: 1.753, 20: 1.725, 25: 1.708, 30: 1.697},
+    0.95: {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306,
+           9: 2.262, 10: 2.228, 12: 2.179, 15: 2.131, 20: 2.086, 25: 2.060, 30: 2.042},
+    0.99: {1: 63.657, 2: 9.925, 3: 5.841, 4: 4.604, 5: 4.032, 6: 3.707, 7: 3.499, 8: 3.355,
+           9: 3.250, 10: 3.169, 12: 3.055, 15: 2.947, 20: 2.845, 25: 2.787, 30: 2.750},
+}
+
+
+def t_critical(df, confidence=0.95):
+    """雙尾 t 臨界值（信賴水準限 0.90 / 0.95 / 0.99）"""
+    if confidence not in _T_TABLE:
+        raise ValueError(f"不支援的信賴水準: {confidence}（可用: {', '.join(map(str, _T_TABLE))}）")
+    table = _T_TABLE[confidence]
+    return table[max(d for d in table if d <= df)]
+
+
+def confidence_interval(values, confidence=0.95):
+    """
+    平均值的 t 信賴區間
+
+    Returns:
+        dict: n、mean、stdev（樣本標準差）、ci_low、ci_high、cv（變異係數）；
+              少於兩個樣本時區間與 cv 為 None
+    """
+    n = len(values)
+    if n == 0:
+        return {'n': 0, 'mean': None, 'stdev': None, 'ci_low': None, 'ci_high': None, 'cv': None}
+
+    mean = sum(values) / n
+    if n < 2:
+        return {'n': n, 'mean': mean, 'stdev': None, 'ci_low': None, 'ci_high': None, 'cv': None}
+
+    stdev = math.sqrt(sum((v - mean) ** 2 for v in values) / (n - 1))
+    half_width = t_critical(n - 1, confidence) * stdev / math.sqrt(n)
+    return {
+        'n': n,
+        'mean': mean,
+        'stdev': stdev,
+        'ci_low': mean - half_width,
+        'ci_high': mean + half_width,
+        'cv': stdev / abs(mean) if mean else None,
+    }
@@ -0,0 +1,29 @@
+# OpenSSL s_server / s_client 共用的記錄層參數
+RECORD_OPTIONS = ('max_send_frag', 'split_send_frag', 'max_pipelines', 'read_buf')
+
+
+def record_layer_args(record=None, ciphersuites=None):
+    """
+    將記錄層設定轉為 s_server / s_client 參數
+
+    Args:
+        record: {max_send_frag, split_send_frag, max_pipelines, read_buf}，未設定的項目沿用 OpenSSL 預設
+        ciphersuites: TLS 1.3 cipher suite，字串或列表
+
+    Raises:
+        ValueError: record 含有不支援的參數
+    """
+    record = record or {}
+    unknown = set(record) - set(RECORD_OPTIONS)
+    if unknown:
+        raise ValueError(f"不支援的記錄層參數: {', '.join(sorted(unknown))}（可用: {', '.join(RECORD_OPTIONS)}）")
+
+    args = []
+    for name in RECORD_OPTIONS:
+        if record.get(name) is not None:
+            args.extend([f'-{name}', str(record[name])])
+    if ciphersuites:
+        if not isinstance(ciphersuites, str):
+            ciphersuites = ':'.join(ciphersuites)
+        args.extend(['-ciphersuites', ciphersuites])
+    return args
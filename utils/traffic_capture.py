@@ -1,9 +1,17 @@
 import os
+import socket
+import struct
 from scapy.all import wrpcap, TCP, conf, AsyncSniffer
 from datetime import datetime
 from utils.settings import settings
+from utils import metrics
 import threading
 
+# Linux AF_PACKET：getsockopt(SOL_PACKET, PACKET_STATISTICS) 回傳 struct tpacket_stats，讀取後歸零
+SOL_PACKET = 263
+PACKET_STATISTICS = 6
+
+
 class TrafficCapture:
     def __init__(self, port=8443, output_dir='data/pcaps', interface=None):
         self.port = port
@@ -15,6 +23,13 @@ class TrafficCapture:
         self.is_capturing = False
         self.capture_thread = None
         self.sniffer = None  # AsyncSniffer 實例
+        self.listen_socket = None  # 自行開啟的監聽 socket，用於讀取丟包統計
+        self.dropped = 0
+
+        # 分段模式：封包由 callback 累積，rotate() 時寫成獨立的 PCAP 分段
+        self.segmented = False
+        self._segment = []
+        self._segment_lock = threading.Lock()
 
         # 使用預設網卡捕獲（不強制 loopback）
         # BPF 過濾器會確保只捕獲指定 port 的流量
@@ -78,6 +93,15 @@ class TrafficCapture:
             if count > 0:
                 kwargs['count'] = count
 
+            # 自行開啟監聽 socket 以讀取核心 / pcap 的丟包統計；失敗時交給 AsyncSniffer 開啟（不回報丟包）
+            try:
+                self.listen_socket = conf.L2listen(iface=self.interface, filter=kwargs['filter'])
+                kwargs = {key: value for key, value in kwargs.items() if key not in ('filter', 'iface')}
+                kwargs['opened_socket'] = self.listen_socket
+            except Exception as e:
+                print(f"[WARN] 無法開啟監聽 socket，丟包統計不可用: {e}")
+                self.listen_socket = None
+
             # 啟動非同步捕獲器
             self.sniffer = AsyncSniffer(**kwargs)
             self.sniffer.start()
@@ -117,6 +141,8 @@ class TrafficCapture:
         # 停止 AsyncSniffer
         if self.sniffer:
             print("\n停止捕獲器...")
+            # 在 sniffer 停止（可能關閉 socket）前讀取丟包統計
+            dropped = self.update_drops()
             try:
                 # 檢查 sniffer 是否正在運行
                 if hasattr(self.sniffer, 'running') and self.sniffer.running:
@@ -132,22 +158,100 @@ class TrafficCapture:
                 print(f"[WARN] 停止捕獲時發生錯誤: {e}")
                 self.packets = []
 
+            if dropped is None:
+                print("[WARN] 此平台無法取得捕獲丟包統計")
+            elif dropped:
+                print(f"[WARN] 捕獲期間丟失 {dropped} 個封包（核心 / pcap 緩衝區不足）")
+            if self.listen_socket is not None:
+                try:
+                    self.listen_socket.close()
+                except Exception:
+                    pass
+                self.listen_socket = None
+
+            # 分段模式由呼叫端以 rotate() 寫出最後一段
+            if self.segmented:
+                return
+
             # 儲存封包
             if self.packets:
                 self._save_packets()
             else:
                 print("[WARN] 未捕獲到任何封包")
+
+    def _read_drops(self):
+        """
+        讀取監聽 socket 自上次讀取後新增的丟包數
+
+        支援 Linux AF_PACKET（PACKET_STATISTICS）與 libpcap / Npcap（pcap_stats）；
+        其他平台回傳 None。
+        """
+        if self.listen_socket is None:
+            return None
+        ins = getattr(self.listen_socket, 'ins', None)
+        try:
+            if isinstance(ins, socket.socket) and hasattr(socket, 'AF_PACKET') and ins.family == socket.AF_PACKET:
+                _, drops = struct.unpack('II', ins.getsockopt(SOL_PACKET, PACKET_STATISTICS, 8))
+                return drops
+            handle = getattr(ins, 'pcap', None)
+            if handle is not None:
+                from ctypes import byref
+                from scapy.libs.winpcapy import pcap_stat, pcap_stats
+                stats = pcap_stat()
+                if pcap_stats(handle, byref(stats)) != 0:
+                    return None
+                # pcap_stats 為累計值
+                drops = max(stats.ps_drop + stats.ps_ifdrop - self.dropped, 0)
+                return drops
+        except Exception:
+            return None
+        return None
+
+    def update_drops(self):
+        """更新丟包計數與 pqctls_capture_dropped_packets_total；平台不支援時回傳 None"""
+        drops = self._read_drops()
+        if drops is None:
+            return None
+        self.dropped += drops
+        metrics.CAPTURE_DROPS.inc(drops)
+        return self.dropped
+
+    def rotate(self, output_file):
+        """
+        將目前累積的封包寫成一個已關閉的 PCAP 分段
+
+        Returns:
+            str: 分段檔案路徑，沒有封包時回傳 None
+        """
+        self.update_drops()
+        with self._segment_lock:
+            packets, self._segment = self._segment, []
+
+        if not packets:
+            return None
+
+        wrpcap(output_file, packets)
+        print(f"[OK] PCAP 分段: {output_file} ({len(packets)} 個封包)")
+        return output_file
     
     def _packet_callback(self, packet):
         """封包回調，即時顯示資訊"""
-        if TCP in packet:
-            flags = packet[TCP].flags
-            flag_str = str(flags)  # 轉成字串避免 FlagValue 格式化錯誤
-            src = f"{packet[0][1].src}:{packet[TCP].sport}"
-            dst = f"{packet[0][1].dst}:{packet[TCP].dport}"
-            length = len(packet)
-
-            print(f"[{len(self.packets)+1:4d}] {src:21} → {dst:21} | Flags: {flag_str:>4} | Len: {length:5d}")
+        metrics.CAPTURED_PACKETS.inc()
+        metrics.CAPTURED_BYTES.inc(len(packet))
+        if self.segmented:
+            with self._segment_lock:
+                self._segment.append(packet)
+        try:
+            if TCP in packet:
+                flags = packet[TCP].flags
+                flag_str = str(flags)  # 轉成字串避免 FlagValue 格式化錯誤
+                src = f"{packet[0][1].src}:{packet[TCP].sport}"
+                dst = f"{packet[0][1].dst}:{packet[TCP].dport}"
+                length = len(packet)
+
+                print(f"[{len(self.packets)+1:4d}] {src:21} → {dst:21} | Flags: {flag_str:>4} | Len: {length:5d}")
+        except Exception:
+            metrics.CAPTURE_CALLBACK_ERRORS.inc()
     
     def _save_packets(self):
         """儲存封包到 pcap 檔案"""